@@ -0,0 +1,122 @@
+import csv
+import argparse
+import numpy
+from itertools import product
+from multiprocessing import Pool, shared_memory
+from engine import Engine, KERNELS, EDGES, DIRECTIONS, parse_flag
+from detector import Detector
+from packing import pack, unpack, packed_size
+
+FIELDS     = ('run', 'seed', 'rng_seed', 'kernel', 'edges', 'spread_factor', 'recursion_factor', 'directions',
+              'faster_eating', 'random_spread', 'random_iter_order', 'single_change',
+              'outcome', 'period', 'generations', 'empty', 'green', 'red', 'yellow')
+
+## first entries of the keys the initial grids and the runs derive their random streams from
+GRID_STREAM= 0
+RUN_STREAM = 1
+
+## set in every worker by attach_seeds(), a view onto the bit-packed initial grids in shared memory
+seeds  = None
+shape  = None
+memory = None
+
+
+def get_rng_seed(*key):
+    ## a 64 bit seed drawn from SeedSequence(key), unrelated to the seed of any other key
+    return int(numpy.random.SeedSequence(list(key)).generate_state(1, numpy.uint64)[0])
+
+def create_seeds(shape, seed_density, count, rng_seed):
+    ## every initial grid is made once in the parent and shared with the workers instead of pickled per run
+    size = packed_size(shape[0] * shape[1])
+    memory = shared_memory.SharedMemory(create=True, size=count * size)
+    grids = numpy.ndarray((count, size), dtype=numpy.uint8, buffer=memory.buf)
+    for seed in range(count):
+        engine = Engine(rows=shape[0], columns=shape[1], seed_density=seed_density, history_size=0, rng_seed=get_rng_seed(GRID_STREAM, rng_seed, seed))
+        engine.set_seed()
+        pack(engine.array, grids[seed])
+    return memory
+
+def attach_seeds(name, count, grid_shape):
+    global seeds, shape, memory
+    memory = shared_memory.SharedMemory(name=name)
+    shape = tuple(grid_shape)
+    seeds = numpy.ndarray((count, packed_size(shape[0] * shape[1])), dtype=numpy.uint8, buffer=memory.buf)
+
+def run_simulation(task):
+    ## runs already fill the pool, so the tiled kernel works through its tiles in this process
+    engine = Engine(history_size=0, kernel=task['kernel'], edges=task['edges'], rng_seed=task['rng_seed'], workers=1)
+    engine.load(unpack(seeds[task['seed']], shape))
+    for name in ('spread_factor', 'recursion_factor', 'faster_eating', 'random_spread', 'random_iter_order', 'single_change'):
+        setattr(engine, name, task[name])
+    engine.set_direction_choices(DIRECTIONS[task['directions']])
+    ## the whole run fits in the window, so cycles of any length are caught
+    engine.detector = Detector(window=task['generations'])
+    if not engine.detector.reset(engine): engine.step(task['generations'])
+    result = dict(task, outcome=engine.detector.outcome or 'max_generations', period=engine.detector.period,
+                  generations=engine.generation)
+    result.update(zip(('empty', 'green', 'red', 'yellow'), engine.get_population()))
+    return result, engine.get_population_series()[:, 1:].copy()
+
+def get_tasks(args):
+    settings = product(range(args.seeds), args.rng_seeds, args.kernels, args.edges, args.spread_factors,
+                       args.recursion_factors, args.directions, args.faster_eating, args.random_spread,
+                       args.random_iter_order, args.single_change)
+    for run, values in enumerate(settings):
+        task = dict(zip(FIELDS[1:12], values), run=run, generations=args.generations)
+        task['rng_seed'] = get_rng_seed(RUN_STREAM, task['rng_seed'], task['seed'])
+        yield task
+
+def run_batch(tasks, shape, seed_density, seed_count, rng_seed=0, processes=None):
+    ## returns one result row per run and the population time series of each run keyed by run number
+    memory = create_seeds(shape, seed_density, seed_count, rng_seed)
+    results, populations = [], {}
+    try:
+        with Pool(processes, initializer=attach_seeds, initargs=(memory.name, seed_count, shape)) as pool:
+            for result, population in pool.imap_unordered(run_simulation, tasks):
+                results.append(result)
+                populations[result['run']] = population
+    finally:
+        memory.close()
+        memory.unlink()
+    results.sort(key=lambda result: result['run'])
+    return results, populations
+
+def write_results(results, populations, file):
+    with open(file, 'w', newline='') as output:
+        writer = csv.DictWriter(output, fieldnames=FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
+    numpy.savez_compressed(file.rsplit('.', 1)[0] + '_populations.npz', **{f'run_{run}': population for run, population in populations.items()})
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Run many independent simulations across a process pool')
+    parser.add_argument('--size', nargs=2, type=int, default=[100, 100], metavar=('ROWS', 'COLUMNS'))
+    parser.add_argument('--seed-density', type=int, default=100)
+    parser.add_argument('--seeds', type=int, default=4, help='number of initial grids')
+    parser.add_argument('--rng-seeds', nargs='+', type=int, default=[0], help='repeats of every grid and setting')
+    parser.add_argument('--kernels', nargs='+', default=['vectorized'], choices=KERNELS)
+    parser.add_argument('--edges', nargs='+', default=['clip'], choices=EDGES)
+    parser.add_argument('--spread-factors', nargs='+', type=int, default=[1])
+    parser.add_argument('--recursion-factors', nargs='+', type=int, default=[0])
+    parser.add_argument('--directions', nargs='+', default=['all'], choices=list(DIRECTIONS))
+    parser.add_argument('--faster-eating', nargs='+', type=parse_flag, default=[False])
+    parser.add_argument('--random-spread', nargs='+', type=parse_flag, default=[True])
+    parser.add_argument('--random-iter-order', nargs='+', type=parse_flag, default=[True])
+    parser.add_argument('--single-change', nargs='+', type=parse_flag, default=[True])
+    parser.add_argument('--generations', type=int, default=500)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--output', default='batch_results.csv')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    tasks = list(get_tasks(args))
+    print(f'{len(tasks)} runs over {args.seeds} initial grids')
+    results, populations = run_batch(tasks, args.size, args.seed_density, args.seeds, processes=args.processes)
+    write_results(results, populations, args.output)
+    outcomes = {}
+    for result in results: outcomes[result['outcome']] = outcomes.get(result['outcome'], 0) + 1
+    print(', '.join(f'{outcome}: {count}' for outcome, count in sorted(outcomes.items())))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+import os
+import csv
+import json
+import argparse
+import platform
+import subprocess
+import tracemalloc
+import numpy
+from itertools import product
+from time import perf_counter
+from engine import Engine, KERNELS, DIRECTIONS, parse_flag
+from renderer import Renderer
+
+FIELDS     = ('kernel', 'size', 'seed_density', 'spread_factor', 'recursion_factor', 'directions',
+              'faster_eating', 'single_change', 'workers', 'steps', 'steps_per_sec', 'cells_per_sec', 'step_ms',
+              'render_ms', 'population_ms', 'frame_ms', 'history_bytes', 'peak_memory_bytes')
+
+
+def create_engine(config, rng_seed):
+    engine = Engine(rows=config['size'], columns=config['size'], kernel=config['kernel'], rng_seed=rng_seed,
+                    workers=config['workers'])
+    engine.seed_density     = config['seed_density']
+    engine.set_seed()
+    engine.spread_factor    = config['spread_factor']
+    engine.recursion_factor = config['recursion_factor']
+    engine.faster_eating    = config['faster_eating']
+    engine.single_change    = config['single_change']
+    engine.set_direction_choices(DIRECTIONS[config['directions']])
+    return engine
+
+def run_config(config, steps, rng_seed, block_size=1):
+    engine = create_engine(config, rng_seed)
+    renderer = Renderer(engine.array.shape, block_size)
+    step_time = render_time = population_time = 0
+    for generation in range(steps):
+        start = perf_counter()
+        engine.step()
+        step_time += perf_counter() - start
+        start = perf_counter()
+        renderer.render(engine.array)
+        render_time += perf_counter() - start
+        start = perf_counter()
+        engine.get_population()
+        population_time += perf_counter() - start
+    result = dict(config, steps=steps)
+    result['steps_per_sec']     = steps / step_time
+    result['cells_per_sec']     = steps * engine.array.size / step_time
+    result['step_ms']           = step_time / steps * 1000
+    result['render_ms']         = render_time / steps * 1000
+    result['population_ms']     = population_time / steps * 1000
+    result['frame_ms']          = result['step_ms'] + result['render_ms'] + result['population_ms']
+    result['history_bytes']     = engine.history.nbytes
+    if engine.tiles: engine.tiles.close()
+    result['peak_memory_bytes'] = measure_peak_memory(config, min(steps, 5), rng_seed, block_size)
+    return result
+
+def measure_peak_memory(config, steps, rng_seed, block_size):
+    ## a separate short pass, tracemalloc slows the timed loop down too much
+    tracemalloc.start()
+    engine = create_engine(config, rng_seed)
+    renderer = Renderer(engine.array.shape, block_size)
+    for generation in range(steps):
+        engine.step()
+        renderer.render(engine.array)
+        engine.get_population()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    if engine.tiles: engine.tiles.close()
+    return peak
+
+def get_configs(args):
+    ## only the tiled kernel uses workers, the others run once per combination
+    for values in product(args.kernels, args.sizes, args.seed_densities, args.spread_factors,
+                          args.recursion_factors, args.directions, args.faster_eating, args.single_change, args.workers):
+        config = dict(zip(FIELDS, values))
+        if config['kernel'] != 'tiled':
+            if config['workers'] != args.workers[0]: continue
+            config['workers'] = None
+        yield config
+
+def get_revision():
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try: return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=directory, capture_output=True, text=True).stdout.strip()
+    except OSError: return ''
+
+def write_results(results, file):
+    if file.endswith('.csv'):
+        with open(file, 'w', newline='') as output:
+            writer = csv.DictWriter(output, fieldnames=FIELDS + ('revision',))
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        with open(file, 'w') as output:
+            json.dump(results, output, indent=1)
+
+def read_results(file):
+    if not file.endswith('.csv'):
+        with open(file) as results: return json.load(results)
+    with open(file, newline='') as results:
+        return [{name: value if name in ('kernel', 'directions', 'revision') else json.loads(value.lower()) if value else None
+                 for name, value in row.items()} for row in csv.DictReader(results)]
+
+def compare(results, baseline):
+    ## prints the steps/sec ratio of every config that also appears in the baseline
+    key = lambda result: tuple(result.get(name) for name in FIELDS[:9])
+    old = {key(result): result for result in baseline}
+    for result in results:
+        if key(result) not in old: continue
+        ratio = result['steps_per_sec'] / old[key(result)]['steps_per_sec']
+        print(f"{ratio:6.2f}x  {' '.join(f'{name}={result[name]}' for name in FIELDS[:9])}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Headless throughput benchmark for the simulation engine')
+    parser.add_argument('--kernels', nargs='+', default=list(KERNELS), choices=KERNELS)
+    parser.add_argument('--sizes', nargs='+', type=int, default=[100, 500])
+    parser.add_argument('--seed-densities', nargs='+', type=int, default=[100])
+    parser.add_argument('--spread-factors', nargs='+', type=int, default=[1, 3])
+    parser.add_argument('--recursion-factors', nargs='+', type=int, default=[0, 2])
+    parser.add_argument('--directions', nargs='+', default=['all', 'diagonal'], choices=list(DIRECTIONS))
+    parser.add_argument('--faster-eating', nargs='+', type=parse_flag, default=[False])
+    parser.add_argument('--single-change', nargs='+', type=parse_flag, default=[True])
+    parser.add_argument('--workers', nargs='+', type=int, default=[os.cpu_count() or 1], help='process counts for the tiled kernel')
+    parser.add_argument('--steps', type=int, default=20)
+    parser.add_argument('--rng-seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_output.json', help='.json or .csv')
+    parser.add_argument('--baseline', help='earlier output to compare steps/sec against')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    revision, results = get_revision(), []
+    print(f'revision {revision or "unknown"}, python {platform.python_version()}, numpy {numpy.__version__}')
+    for config in get_configs(args):
+        result = run_config(config, args.steps, args.rng_seed)
+        result['revision'] = revision
+        results.append(result)
+        print(f"{result['steps_per_sec']:9.1f} steps/s {result['cells_per_sec']:12.0f} cells/s "
+              f"{result['render_ms']:7.2f} ms render  {' '.join(f'{name}={config[name]}' for name in config)}")
+    write_results(results, args.output)
+    if args.baseline: compare(results, read_results(args.baseline))
+
+if __name__ == '__main__':
+    main()
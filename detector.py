@@ -0,0 +1,90 @@
+import numpy
+from collections import deque
+from tiles import mix
+
+## from least to most final, a decided run only moves further along
+OUTCOMES   = ('cycle', 'extinction', 'fixed_point')
+
+
+def hash_cells(cells, values):
+    ## XOR of one 64 bit key per occupied cell, empty cells add nothing
+    occupied = values != 0
+    keys = mix(cells[occupied].astype(numpy.uint64) * numpy.uint64(4) + values[occupied].astype(numpy.uint64))
+    return int(numpy.bitwise_xor.reduce(keys)) if len(keys) else 0
+
+
+class Detector():
+
+    ## Notices when a run is decided, switched on with engine.detector = Detector().
+    ## Extinction is read off the population counts: at most one species is left. A fixed
+    ## point is a grid without active cells, nothing can change any more; it is only looked
+    ## for after a generation that changed nothing. Grid states are hashed Zobrist-style,
+    ## as the XOR of a key per occupied cell, kept current from the cells that change each
+    ## generation. A hash seen again within the last `window` generations means the grid
+    ## came back to an earlier state, reported as a cycle of that period. Spreading is
+    ## random, so a cycle is a strong hint rather than a guarantee the run repeats, and
+    ## with 64 bit hashes a false match is possible but vanishingly unlikely.
+    ##
+    ## With stop set, engine.step(n) returns early on the generation the outcome changes.
+    ## on_outcome(outcome, engine) is called at that point too, from the stepping thread.
+
+    def __init__(self, window=256, stop=True, on_outcome=None):
+        self.window           = window
+        self.stop             = stop
+        self.on_outcome       = on_outcome
+        self.hash             = 0
+        self.generation       = None
+        self.outcome          = None
+        self.period           = None
+        self.decided_at       = None
+        self.seen             = {}
+        self.order            = deque()
+
+    def reset(self, engine):
+        ## hashes the whole grid, needed whenever it changed other than by a step
+        cells = numpy.flatnonzero(engine.array)
+        self.hash = hash_cells(cells, engine.array.flat[cells])
+        return self.restart(engine)
+
+    def edit(self, engine, cells, old_values):
+        ## cells written between steps: the hash follows them and the outcome is decided afresh
+        if self.generation != engine.generation: return self.reset(engine)
+        self.hash ^= hash_cells(cells, old_values) ^ hash_cells(cells, engine.array.flat[cells])
+        return self.restart(engine)
+
+    def restart(self, engine):
+        self.outcome = self.period = self.decided_at = None
+        self.seen, self.order = {}, deque()
+        self.generation = engine.generation
+        return self.check(engine)
+
+    def update(self, engine, old_values):
+        ## after a step, old_values are what engine.changed_index held before it
+        if self.generation != engine.generation - 1: return self.reset(engine)
+        changed = engine.changed_index
+        self.hash ^= hash_cells(changed, old_values) ^ hash_cells(changed, engine.array.flat[changed])
+        self.generation = engine.generation
+        return self.check(engine)
+
+    def check(self, engine):
+        ## returns True when the outcome changed at this generation
+        outcome, period = None, None
+        repeat = self.generation - self.seen.get(self.hash, self.generation)
+        if repeat > 1: outcome, period = 'cycle', repeat
+        if sum(1 for count in engine.population[1:] if count) <= 1: outcome, period = 'extinction', None
+        if repeat == 1 or not self.seen:
+            if not len(engine.get_active_cells()): outcome, period = 'fixed_point', 1
+        self.seen[self.hash] = self.generation
+        self.order.append(self.hash)
+        while len(self.order) > self.window:
+            old_hash = self.order.popleft()
+            if old_hash in self.seen and self.seen[old_hash] <= self.generation - self.window: del self.seen[old_hash]
+        if outcome is None or (self.outcome and OUTCOMES.index(outcome) <= OUTCOMES.index(self.outcome)): return False
+        self.outcome, self.period, self.decided_at = outcome, period, self.generation
+        if self.on_outcome: self.on_outcome(outcome, engine)
+        return True
+
+    def describe(self):
+        if self.outcome == 'cycle': return f'cycle of period {self.period} from generation {self.decided_at}'
+        if self.outcome: return f"{self.outcome.replace('_', ' ')} at generation {self.decided_at}"
+        return 'undecided'
@@ -0,0 +1,612 @@
+import json
+import heapq
+import numpy
+from itertools import islice, permutations
+from history import History
+from packing import PackedGrid, pack
+from seeding import SEEDINGS
+
+KERNELS    = ('sequential', 'vectorized', 'tiled')
+EDGES      = ('clip', 'wrap')
+## the direction choices set_direction_choices() takes, by name
+DIRECTIONS = {'all': [-1, -1, 0, 1, 1], 'diagonal': [-1, -1, 1, 1]}
+## CONVERTS[force, target] is True when force may spread onto target
+CONVERTS   = numpy.array([[False, False, False, False],
+                          [True,  False, False, True ],
+                          [True,  True,  False, False],
+                          [True,  False, True,  False]])
+PREDATOR   = numpy.array([0, 2, 3, 1], dtype=numpy.uint8)
+## plain list copies of the tables above for scalar lookups in the sequential kernel
+TARGETS    = CONVERTS.tolist()
+PREDATOR_OF= PREDATOR.tolist()
+SETTINGS   = ('faster_eating', 'random_spread', 'random_iter_order', 'single_change', 'recursion_factor',
+              'spread_factor', 'direction_choices', 'spin', 'kernel', 'edges', 'seed_density')
+
+
+def parse_flag(value):
+    ## a boolean setting given on the command line, as in --faster-eating on off
+    return value.lower() in ('1', 'true', 'on', 'yes')
+
+def find_writes(array, attackers, index, priority, options, spread_factor, edges, faster_eating):
+    ## Every write the attackers make against array, where attacker i starts at direction
+    ## index[i]. When several writes land on one cell, the one whose attacker has the highest
+    ## priority wins. Returns the winning cells, values, kinds (the spread that made the
+    ## write, or -1 for an eater vacating its square or a backfire), the attacker of each
+    ## write and the number of spread attempts. Empty attackers are skipped, sources still
+    ## index the attackers as given.
+    rows, columns = array.shape
+    occupied = numpy.flatnonzero(array.flat[attackers] != 0)
+    attackers, index, priority = attackers[occupied], index[occupied], priority[occupied]
+    forces = array.flat[attackers]
+    x, y = numpy.divmod(attackers, columns)
+    writes, attempts, count = [], 0, 0
+    for spread in range(spread_factor):
+        x_direction, y_direction = options[(index - spread) % len(options)].T
+        target_x, target_y = x + x_direction, y + y_direction
+        if edges == 'wrap':
+            target_x, target_y = target_x % rows, target_y % columns
+            source = numpy.arange(len(attackers))
+        else:
+            source = numpy.flatnonzero((target_x >= 0) & (target_x < rows) & (target_y >= 0) & (target_y < columns))
+        target = target_x[source] * columns + target_y[source]
+        attempts += len(source)
+        force, targeted = forces[source], array.flat[target]
+        success = CONVERTS[force, targeted]
+        ## an eater's move is paired with the write that vacates its square
+        moves = (force[success] == 2) & (targeted[success] == 0)
+        writes.append((target[success], force[success], source[success], spread, -1))
+        writes.append((attackers[source[success][moves]], 0, source[success][moves], -1, count + numpy.flatnonzero(moves)))
+        count += int(success.sum()) + int(moves.sum())
+        if faster_eating:
+            backfires = targeted == PREDATOR[force]
+            writes.append((attackers[source[backfires]], PREDATOR[force[backfires]], source[backfires], -1, -1))
+            count += int(backfires.sum())
+    cells   = numpy.concatenate([cell for cell, value, source, kind, pair in writes])
+    values  = numpy.concatenate([numpy.broadcast_to(value, len(cell)) for cell, value, source, kind, pair in writes]).astype(numpy.uint8)
+    sources = numpy.concatenate([source for cell, value, source, kind, pair in writes])
+    kinds   = numpy.concatenate([numpy.full(len(cell), kind) for cell, value, source, kind, pair in writes])
+    pairs   = numpy.concatenate([numpy.broadcast_to(pair, len(cell)) for cell, value, source, kind, pair in writes]).astype(int)
+    winners = find_winners(cells, priority[sources])
+    ## an eater whose move lost stays where it is, so its vacating write is dropped and
+    ## the cell goes to the best of the remaining writes. Moves land on empty cells, never
+    ## on an eater's square, so dropping vacates can't change which moves won
+    won = numpy.zeros(len(cells), dtype=bool)
+    won[winners] = True
+    stranded = (pairs >= 0) & ~won[pairs]
+    if stranded.any():
+        kept = numpy.flatnonzero(~stranded)
+        winners = kept[find_winners(cells[kept], priority[sources[kept]])]
+    return cells[winners], values[winners], kinds[winners], occupied[sources[winners]], attempts
+
+def find_winners(cells, priority):
+    ## the index of the highest priority write to every cell written
+    order   = numpy.lexsort((priority, cells))
+    last    = numpy.ones(len(order), dtype=bool)
+    last[:-1] = cells[order][1:] != cells[order][:-1]
+    return order[last]
+
+class Engine():
+
+    def __init__(self, rows=100, columns=100, seed_density=100, history_size=50, kernel='sequential', edges='clip',
+                 history_budget=None, rng_seed=None, workers=None, packed=False):
+        if kernel not in KERNELS: raise ValueError(f'unknown kernel {kernel!r}, expected one of {KERNELS}')
+        if edges not in EDGES: raise ValueError(f'unknown edges {edges!r}, expected one of {EDGES}')
+        self.shape            = (rows, columns)
+        self.array            = self.create_array()
+        self.seed             = PackedGrid.from_array(self.array)
+        self.seed_density     = seed_density
+        self.seeding          = 'scatter'
+        self.seed_options     = {}
+        self.kernel           = kernel
+        self.edges            = edges
+        self.history          = History(history_size, memory_budget=history_budget)
+        self.generation       = 0
+        self.previous         = None
+        self.packed           = packed
+        self.recorder         = None
+        self.profiler         = None
+        self.detector         = None
+        self.workers          = workers
+        self.tiles            = None
+        self.population       = [0,0,0,0]
+        self.population_series= numpy.zeros((0, 5), dtype=numpy.int64)
+        self.series_length    = 0
+        self.changed_cells    = {}
+        self.changed_index    = numpy.zeros(0, dtype=numpy.intp)
+        self.track_active     = True
+        self.active           = None
+        self.frontier_key     = None
+        self.forces_iter_dict = {1:Spreader.iterate, 2: Eater.iterate, 3: Cleaner.iterate}
+        self.reseed(rng_seed)
+        self.set_defaults()
+        self.count_population()
+
+    def create_array(self):
+        array = numpy.zeros(self.shape, dtype=numpy.uint8)
+        return array
+
+    def set_defaults(self):
+        self.faster_eating    = False
+        self.random_spread    = True
+        self.random_iter_order= True
+        self.single_change    = True
+        self.recursion_factor = 0
+        self.spread_factor    = 1
+        self.changed_cells    = {}
+        self.changed_index    = numpy.zeros(0, dtype=numpy.intp)
+        self.set_direction_choices(DIRECTIONS['all'])
+
+    def set_direction_choices(self, direction_choices):
+        self.direction_choices= list(direction_choices)
+        self.direction_options= list(dict.fromkeys(list(permutations(self.direction_choices, 2))))
+        self.spin             = int(self.rng.integers(len(self.direction_options)))
+
+    def toggle_direction_choice(self):
+        if 0 in self.direction_choices: self.set_direction_choices(DIRECTIONS['diagonal'])
+        else: self.set_direction_choices(DIRECTIONS['all'])
+
+    def set_spin(self, sign):
+        self.spin += sign
+        if self.spin == len(self.direction_options): self.spin = 0
+        if self.spin < 0: self.spin = len(self.direction_options) - 1
+
+    def reseed(self, rng_seed=None):
+        ## a fresh seed is drawn from the OS when none is given, so every run can be replayed
+        self.rng_seed         = numpy.random.SeedSequence().entropy if rng_seed is None else rng_seed
+        self.rng              = numpy.random.default_rng(self.rng_seed)
+        self.random_buffer    = iter(())
+
+    def random(self):
+        ## scalar draws for the sequential kernel, taken from the generator in bulk.
+        ## iterate() drops leftovers each generation so saved generator state is exact
+        try: return next(self.random_buffer)
+        except StopIteration:
+            self.random_buffer = iter(self.rng.random(4096).tolist())
+            return next(self.random_buffer)
+
+    def set_seed(self, rng_seed=None, seeding=None, **seed_options):
+        ## places a seed on top of the grid. seeding picks a strategy from seeding.py and is
+        ## kept, with its options, for later seeds; scatter places seed_density cells
+        if rng_seed is not None: self.reseed(rng_seed)
+        if seeding is not None:
+            if seeding not in SEEDINGS: raise ValueError(f'unknown seeding {seeding!r}, expected one of {tuple(SEEDINGS)}')
+            self.seeding, self.seed_options = seeding, seed_options
+        options = dict(self.seed_options)
+        if self.seeding == 'scatter': options.setdefault('count', self.seed_density)
+        if self.seeding in ('blobs', 'voronoi'): options.setdefault('wrap', self.edges == 'wrap')
+        grid = SEEDINGS[self.seeding](self.rng, self.array.shape, **options)
+        placed = grid != 0
+        self.array[placed] = grid[placed]
+        self.seed = PackedGrid.from_array(self.array)
+        self.clear_history()
+
+    def clear_history(self, packed=None):
+        self.history.clear()
+        self.generation = 0
+        self.invalidate_frontier()
+        self.count_population(packed)
+        if self.detector: self.detector.reset(self)
+
+    def array_edited(self):
+        ## call after writing to the array from outside the engine
+        self.invalidate_frontier()
+        self.population = numpy.bincount(self.array.ravel(), minlength=4).tolist()
+        if self.series_length and self.population_series[self.series_length-1, 0] == self.generation:
+            self.series_length -= 1
+        self.record_population()
+        if self.detector: self.detector.reset(self)
+        if self.recorder: self.recorder.rewind(self)
+
+    def get_brush(self, x, y, radius, shape='square'):
+        ## flat indices of the cells within radius of (x, y), in a square or a circle
+        offsets_x, offsets_y = numpy.mgrid[-radius:radius + 1, -radius:radius + 1].reshape(2, -1)
+        if shape == 'circle':
+            inside = offsets_x**2 + offsets_y**2 <= radius**2
+            offsets_x, offsets_y = offsets_x[inside], offsets_y[inside]
+        rows, columns = self.array.shape
+        cells_x, cells_y = x + offsets_x, y + offsets_y
+        if self.edges == 'wrap': cells_x, cells_y = cells_x % rows, cells_y % columns
+        else:
+            valid = (cells_x >= 0) & (cells_x < rows) & (cells_y >= 0) & (cells_y < columns)
+            cells_x, cells_y = cells_x[valid], cells_y[valid]
+        return numpy.unique(cells_x * columns + cells_y)
+
+    def edit_cells(self, cells, force, only_empty=False):
+        ## writes force to cells between steps. Counts, the frontier and the hash follow the
+        ## edited cells only, and the edit is folded into this generation's history diff so
+        ## stepping back past it restores them. Returns the cells that changed
+        old_values = self.array.flat[cells]
+        changed = (old_values != force) & (old_values == 0 if only_empty else True)
+        cells, old_values = cells[changed], old_values[changed]
+        self.array.flat[cells] = force
+        self.count_changes(old_values, numpy.full(len(cells), force, dtype=numpy.uint8))
+        if self.series_length and self.population_series[self.series_length-1, 0] == self.generation:
+            self.series_length -= 1
+        self.record_population()
+        if self.history.depth: self.history.edit(self.generation, cells, old_values, force)
+        if self.frontier_key == self.get_frontier_key(): self.update_active(cells)
+        if self.detector: self.detector.edit(self, cells, old_values)
+        if self.recorder: self.recorder.rewind(self)
+        return cells
+
+    def nuke(self, x, y, radius=10, shape='square'):
+        return self.edit_cells(self.get_brush(x, y, radius, shape), 0)
+
+    def paint(self, x, y, force, radius=3, shape='circle'):
+        return self.edit_cells(self.get_brush(x, y, radius, shape), force)
+
+    def fill(self, x, y, force, radius=10, shape='circle'):
+        ## like paint, but only empty cells are taken
+        return self.edit_cells(self.get_brush(x, y, radius, shape), force, only_empty=True)
+
+    def new_simulation(self, rng_seed=None):
+        self.reseed(rng_seed)
+        self.array = self.create_array()
+        self.clear_history()
+        self.set_defaults()
+        self.set_seed()
+
+    def load(self, array, packed=None):
+        self.shape = array.shape
+        self.array = array.astype(numpy.uint8)
+        self.seed = PackedGrid.from_array(self.array) if packed is None else packed
+        self.clear_history(packed)
+
+    def save(self, file):
+        state = {name: getattr(self, name) for name in SETTINGS}
+        state.update(rng_seed=self.rng_seed, rng_state=self.rng.bit_generator.state, generation=self.generation)
+        numpy.savez(file, shape=numpy.array(self.array.shape), packed_array=pack(self.array), packed_seed=self.seed.data,
+                    state=json.dumps(state))
+
+    def load_file(self, file):
+        ## .npy files only hold a grid, .npz files written by save() also restore settings and the generator
+        loaded = numpy.load(file)
+        if isinstance(loaded, numpy.ndarray): return self.load(loaded)
+        packed = None
+        if 'packed_array' in loaded.files:
+            packed = PackedGrid(tuple(loaded['shape']), loaded['packed_array'])
+            self.load(packed.to_array(), packed)
+            self.seed = PackedGrid(tuple(loaded['shape']), loaded['packed_seed'])
+        else:
+            self.load(loaded['array'])
+            self.seed = PackedGrid.from_array(loaded['seed'])
+        state = json.loads(str(loaded['state']))
+        self.set_direction_choices(state.pop('direction_choices'))
+        self.reseed(state.pop('rng_seed'))
+        self.rng.bit_generator.state = state.pop('rng_state')
+        self.generation = state.pop('generation')
+        self.count_population(packed)
+        for name, value in state.items(): setattr(self, name, value)
+
+    def reset(self):
+        self.array = self.seed.to_array()
+        self.clear_history(self.seed)
+
+    def get_frontier_key(self):
+        return (id(self.array), self.array.shape, tuple(self.direction_options), self.edges, self.faster_eating)
+
+    def invalidate_frontier(self):
+        self.frontier_key = None
+
+    def find_active(self, cells):
+        ## a cell is active when one of its neighbours is something it can spread onto,
+        ## or with faster eating, its predator
+        forces = self.array.flat[cells]
+        x, y = numpy.divmod(cells, self.shape[1])
+        active = numpy.zeros(len(cells), dtype=bool)
+        for x_direction, y_direction in self.direction_options:
+            target_x, target_y = x + x_direction, y + y_direction
+            if self.edges == 'wrap':
+                valid = slice(None)
+                target_x, target_y = target_x % self.shape[0], target_y % self.shape[1]
+            else:
+                valid = (target_x >= 0) & (target_x < self.shape[0]) & (target_y >= 0) & (target_y < self.shape[1])
+                target_x, target_y = target_x[valid], target_y[valid]
+            targeted = self.array[target_x, target_y]
+            active[valid] |= CONVERTS[forces[valid], targeted]
+            if self.faster_eating: active[valid] |= (targeted == PREDATOR[forces[valid]]) & (forces[valid] != 0)
+        return active
+
+    def find_all_active(self):
+        ## same rule as find_active, but over whole shifted slices of the grid
+        rows, columns = self.shape
+        active = numpy.zeros(self.shape, dtype=bool)
+        for x_direction, y_direction in self.direction_options:
+            if self.edges == 'wrap':
+                source, targeted = self.array, numpy.roll(self.array, (-x_direction, -y_direction), axis=(0, 1))
+                sources = active
+            else:
+                source_rows = slice(max(0, -x_direction), rows - max(0, x_direction))
+                source_columns = slice(max(0, -y_direction), columns - max(0, y_direction))
+                target_rows = slice(source_rows.start + x_direction, source_rows.stop + x_direction)
+                target_columns = slice(source_columns.start + y_direction, source_columns.stop + y_direction)
+                source, targeted = self.array[source_rows, source_columns], self.array[target_rows, target_columns]
+                sources = active[source_rows, source_columns]
+            sources |= CONVERTS.ravel()[(source << 2) | targeted]
+            if self.faster_eating: sources |= (targeted == PREDATOR[source]) & (source != 0)
+        return active
+
+    def update_active(self, changed_index=None):
+        ## without changed_index the whole grid is rescanned, otherwise only the changed
+        ## cells and the cells that can reach them are looked at again. Rescanning is
+        ## cheaper once a large share of the grid has changed
+        rescan = changed_index is None or len(changed_index) * (len(self.direction_options) + 1) > self.array.size // 4
+        if rescan or self.frontier_key != self.get_frontier_key():
+            self.active = self.find_all_active()
+            self.frontier_key = self.get_frontier_key()
+        else:
+            x, y = numpy.divmod(changed_index, self.shape[1])
+            neighbors = [changed_index]
+            for x_direction, y_direction in self.direction_options:
+                source_x, source_y = x - x_direction, y - y_direction
+                if self.edges == 'wrap':
+                    source_x, source_y = source_x % self.shape[0], source_y % self.shape[1]
+                else:
+                    valid = (source_x >= 0) & (source_x < self.shape[0]) & (source_y >= 0) & (source_y < self.shape[1])
+                    source_x, source_y = source_x[valid], source_y[valid]
+                neighbors.append(source_x * self.shape[1] + source_y)
+            cells = numpy.unique(numpy.concatenate(neighbors))
+            self.active.flat[cells] = self.find_active(cells)
+
+    def get_active_cells(self):
+        if self.frontier_key != self.get_frontier_key(): self.update_active()
+        return numpy.flatnonzero(self.active)
+
+    def get_visit_order(self):
+        ## rows and columns are shuffled separately, like walking a shuffled grid row by row.
+        ## Once most occupied cells are active, walking the grid is cheaper than the frontier
+        rows, columns = self.shape
+        active = self.get_active_cells() if self.track_active else None
+        if active is None or len(active) > (self.array.size - self.population[0]) // 2:
+            array_rows, array_columns = range(rows), range(columns)
+            if self.random_iter_order:
+                array_rows = self.rng.permutation(rows).tolist()
+                array_columns = self.rng.permutation(columns).tolist()
+            return ((x, y) for x in array_rows for y in array_columns)
+        x, y = numpy.divmod(active, columns)
+        row_rank, column_rank = numpy.arange(rows), numpy.arange(columns)
+        if self.random_iter_order:
+            row_rank, column_rank = numpy.argsort(self.rng.permutation(rows)), numpy.argsort(self.rng.permutation(columns))
+            order = numpy.argsort(row_rank[x] * columns + column_rank[y])
+            x, y = x[order], y[order]
+        return self.walk_frontier(x.tolist(), y.tolist(), row_rank.tolist(), column_rank.tolist())
+
+    def walk_frontier(self, cells_x, cells_y, row_rank, column_rank):
+        ## visits the active cells in order, and queues cells that can reach a cell changed
+        ## during the sweep when they come later in the order. A cell that turns active
+        ## partway through a generation, say next to a square an eater just left, is still
+        ## visited in it, like in a sweep over every cell
+        rows, columns = self.shape
+        wrap, reaches, changed = self.edges == 'wrap', [(0, 0)] + self.direction_options, self.changed_cells
+        ## the frontier is already sorted, only the cells queued on the way go through a heap
+        ranks = [row_rank[x] * columns + column_rank[y] for x, y in zip(cells_x, cells_y)]
+        queued, extra = set(zip(cells_x, cells_y)), []
+        index, count, seen = 0, len(ranks), 0
+        while index < count or extra:
+            if extra and (index == count or extra[0][0] < ranks[index]): rank, x, y = heapq.heappop(extra)
+            else: rank, x, y, index = ranks[index], cells_x[index], cells_y[index], index + 1
+            yield x, y
+            new = len(changed) - seen
+            if not new: continue
+            seen += new
+            for changed_x, changed_y in islice(reversed(changed), new):
+                for x_direction, y_direction in reaches:
+                    source_x, source_y = changed_x - x_direction, changed_y - y_direction
+                    if wrap: source_x, source_y = source_x % rows, source_y % columns
+                    elif not (0 <= source_x < rows and 0 <= source_y < columns): continue
+                    if (source_x, source_y) in queued: continue
+                    source_rank = row_rank[source_x] * columns + column_rank[source_y]
+                    if source_rank > rank:
+                        queued.add((source_x, source_y))
+                        heapq.heappush(extra, (source_rank, source_x, source_y))
+
+    def set_cell(self, x, y, force):
+        ## every write made by the sequential kernel goes through here to keep the counts current
+        self.population[self.array[x, y]] -= 1
+        self.population[force] += 1
+        self.array[x, y] = force
+        self.changed_cells[(x, y)] = force
+
+    def count_changes(self, old_values, new_values):
+        delta = numpy.bincount(new_values, minlength=4) - numpy.bincount(old_values, minlength=4)
+        for force, change in enumerate(delta.tolist()): self.population[force] += change
+
+    def iterate(self):
+        if self.kernel == 'vectorized': return self.iterate_vectorized()
+        if self.kernel == 'tiled': return self.iterate_tiled()
+        profiler = self.profiler
+        self.changed_cells = {}
+        self.random_buffer = iter(())
+        if profiler: profiler.mark()
+        visit_order = self.get_visit_order()
+        if profiler: profiler.lap('order')
+        for x, y in visit_order:
+            force = self.array[x, y]
+            if force in {0}: continue
+            condition = (x, y) not in self.changed_cells if self.single_change else True
+            if condition:
+                self.forces_iter_dict[force](self, x, y, self.recursion_factor)
+        if profiler: profiler.lap('spread')
+        columns = self.shape[1]
+        self.changed_index = numpy.fromiter((x * columns + y for x, y in self.changed_cells), dtype=numpy.intp, count=len(self.changed_cells))
+        if self.track_active: self.update_active(self.changed_index)
+        if profiler: profiler.lap('frontier')
+
+    def iterate_vectorized(self):
+        ## Every cell spreads at once against the grid as it was at the start of the
+        ## generation. When several writes land on the same cell (spreads, an eater
+        ## vacating its square, a backfire) the one with the highest random priority
+        ## wins. Recursive spreading runs as extra rounds seeded by the cells that were
+        ## taken by a first spread, each round reading the grid left by the last one.
+        profiler = self.profiler
+        self.changed_cells = {}
+        if profiler: profiler.mark()
+        attackers = self.get_active_cells() if self.track_active else numpy.flatnonzero(self.array)
+        if profiler: profiler.lap('order')
+        budgets = numpy.full(len(attackers), self.recursion_factor)
+        changed = []
+        while len(attackers):
+            cells, values, chain, sources = self.spread_vectorized(attackers)
+            if profiler and changed: profiler.count(depth=len(changed))
+            changed.append(cells)
+            if not self.recursion_factor: break
+            attackers, budgets = chain, budgets[sources]
+            rolls = (self.rng.random(len(attackers)) * (budgets + 1)).astype(int) > 0
+            attackers, budgets = attackers[rolls], budgets[rolls] - 1
+        if profiler: profiler.lap('spread')
+        if not changed: changed.append(numpy.zeros(0, dtype=numpy.intp))
+        self.changed_index = numpy.unique(numpy.concatenate(changed))
+        if self.track_active: self.update_active(self.changed_index)
+        if profiler: profiler.lap('frontier')
+
+    def iterate_tiled(self):
+        ## the vectorized rules split over a process pool, see tiles.py. tiles.py imports
+        ## this module, so it is imported here rather than at the top
+        from tiles import Tiles
+        profiler = self.profiler
+        if self.tiles is None or self.tiles.shape != self.array.shape:
+            if self.tiles: self.tiles.close()
+            self.tiles = Tiles(self.array.shape, self.workers)
+        self.changed_cells = {}
+        if profiler: profiler.mark()
+        self.tiles.iterate(self)
+        if profiler: profiler.lap('spread')
+        self.invalidate_frontier()
+
+    def spread_vectorized(self, attackers):
+        options = numpy.array(self.direction_options)
+        if self.random_spread: index = self.rng.integers(len(options), size=len(attackers))
+        else: index = numpy.full(len(attackers), self.spin)
+        priority = self.rng.random(len(attackers))
+        cells, values, kinds, sources, attempts = find_writes(self.array, attackers, index, priority, options,
+                                                              self.spread_factor, self.edges, self.faster_eating)
+        if self.profiler:
+            backfires = (kinds < 0) & (values != 0)
+            self.profiler.count(attempts=attempts, conversions=int((kinds >= 0).sum()), backfires=int(backfires.sum()))
+        self.count_changes(self.array.flat[cells], values)
+        self.array.flat[cells] = values
+        chain   = kinds == 0
+        return cells, values, cells[chain], sources[chain]
+
+    def step(self, n=1):
+        for generation in range(n):
+            profiler = self.profiler
+            if profiler: profiler.mark()
+            if self.history.depth or self.detector:
+                ## packed, the copy of the last generation takes a quarter of the working grid
+                if self.previous is None or self.previous.shape != self.array.shape or isinstance(self.previous, PackedGrid) != self.packed:
+                    self.previous = PackedGrid(self.array.shape) if self.packed else numpy.empty_like(self.array)
+                if self.packed: self.previous.update(self.array)
+                else: numpy.copyto(self.previous, self.array)
+            if profiler: profiler.lap('history')
+            self.iterate()
+            self.generation += 1
+            self.record_population()
+            if profiler: profiler.lap('population')
+            if self.recorder: self.recorder.record(self)
+            if profiler: profiler.lap('record')
+            if self.history.depth or self.detector:
+                old_values = self.previous.get(self.changed_index) if self.packed else self.previous.flat[self.changed_index]
+            if self.history.depth:
+                self.history.push(self.generation, self.changed_index, old_values, self.array)
+            if profiler:
+                profiler.lap('history')
+                profiler.end_step(self)
+            if self.detector and self.detector.update(self, old_values) and self.detector.stop: break
+
+    def back(self, steps=1):
+        rewound = self.history.back(self.array, steps)
+        if rewound is None: return False
+        self.generation, self.changed_index = rewound
+        self.invalidate_frontier()
+        while self.series_length and self.population_series[self.series_length-1, 0] > self.generation:
+            self.series_length -= 1
+        if self.series_length and self.population_series[self.series_length-1, 0] == self.generation:
+            self.population = self.population_series[self.series_length-1, 1:].tolist()
+        else: self.count_population()
+        self.changed_cells = {}
+        if self.detector: self.detector.reset(self)
+        if self.recorder: self.recorder.rewind(self)
+        return True
+
+    def count_population(self, packed=None):
+        ## full recount, only needed when the whole array is replaced; starts a new series.
+        ## A packed copy of the array, where there is one, is counted in a quarter of the reads
+        counts = numpy.bincount(self.array.ravel(), minlength=4) if packed is None else packed.count()
+        self.population = counts.tolist()
+        self.series_length = 0
+        self.record_population()
+
+    def record_population(self):
+        if self.series_length == len(self.population_series):
+            grown = numpy.zeros((max(64, 2 * self.series_length), 5), dtype=numpy.int64)
+            grown[:self.series_length] = self.population_series[:self.series_length]
+            self.population_series = grown
+        self.population_series[self.series_length] = [self.generation] + self.population
+        self.series_length += 1
+
+    def get_population(self):
+        return self.population
+
+    def get_population_series(self):
+        ## one row per generation: generation, empty, green, red, yellow
+        return self.population_series[:self.series_length]
+
+class Forces():
+
+    ## A cell taken by a first spread spreads again straight away, up to recursion_factor
+    ## cells deep. The chain runs off an explicit stack: the cell that spread waits on the
+    ## stack under the cell it took and finishes its remaining spreads once that cell is
+    ## done, so cells are handled and random numbers drawn in the same order as nested
+    ## calls would, without growing the Python call stack.
+
+    def chain(engine, array_x_pos, array_y_pos, force, recursion_factor):
+        array, options, (rows, columns) = engine.array, engine.direction_options, engine.shape
+        wrap, spread_factor, converts = engine.edges == 'wrap', engine.spread_factor, TARGETS[force]
+        predator, vacates = PREDATOR_OF[force], force == 2
+        ## (x, y, recursion_factor, direction index, spread to resume at, backfired)
+        stack = [(array_x_pos, array_y_pos, recursion_factor, None, 0, False)]
+        attempts = conversions = backfires = depth = 0
+        while stack:
+            x, y, recursion_factor, index, spread, backfire = stack.pop()
+            resumed = index is not None
+            if not resumed: index = int(engine.random() * len(options)) if engine.random_spread else engine.spin
+            while spread < spread_factor:
+                x_direction, y_direction = options[(index - spread) % len(options)]
+                target_x, target_y = x + x_direction, y + y_direction
+                if wrap: target_x, target_y = target_x % rows, target_y % columns
+                elif not (0 <= target_x < rows and 0 <= target_y < columns):
+                    spread += 1
+                    continue
+                if resumed: resumed = False
+                else:
+                    attempts += 1
+                    if converts[array[target_x, target_y]]:
+                        conversions += 1
+                        if vacates and array[target_x, target_y] == 0: engine.set_cell(x, y, 0)
+                        engine.set_cell(target_x, target_y, force)
+                        if engine.recursion_factor and spread < 1 and int(engine.random() * (recursion_factor + 1)) > 0:
+                            recursion_factor -= 1
+                            stack.append((x, y, recursion_factor, index, spread, backfire))
+                            stack.append((target_x, target_y, recursion_factor, None, 0, False))
+                            depth = max(depth, len(stack) - 1)
+                            break
+                if engine.faster_eating:
+                    if array[target_x, target_y] == predator: backfire = True
+                    if spread + 1 == spread_factor and backfire:
+                        engine.set_cell(x, y, predator)
+                        backfires += 1
+                spread += 1
+        if engine.profiler: engine.profiler.count(attempts, conversions, backfires, depth)
+
+class Spreader(Forces):
+    def iterate(engine, array_x_pos, array_y_pos, recursion_factor):
+        Forces.chain(engine, array_x_pos, array_y_pos, 1, recursion_factor)
+
+class Eater(Forces):
+    def iterate(engine, array_x_pos, array_y_pos, recursion_factor):
+        Forces.chain(engine, array_x_pos, array_y_pos, 2, recursion_factor)
+
+class Cleaner(Forces):
+    def iterate(engine, array_x_pos, array_y_pos, recursion_factor):
+        Forces.chain(engine, array_x_pos, array_y_pos, 3, recursion_factor)
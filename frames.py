@@ -0,0 +1,54 @@
+import os
+from collections import deque
+from multiprocessing import Pool
+from packing import PackedGrid
+from renderer import Renderer
+
+## set in every writer process by start_writer()
+renderer = None
+
+
+def start_writer(shape, block_size):
+    global renderer
+    renderer = Renderer(shape, block_size)
+
+def write_frames(batch, directory, shape):
+    for generation, packed in batch:
+        renderer.render(PackedGrid(shape, packed)).convert('RGB').save(os.path.join(directory, f'frame_{generation:06d}.png'))
+    return len(batch)
+
+
+class FrameWriter():
+
+    ## Saves every `every`th generation as a PNG. Grids are bit-packed and handed to a
+    ## process pool in batches, so encoding runs beside the stepping loop rather than in
+    ## it. At most two batches per process wait in the queue; past that record() waits
+    ## for the oldest one, so a slow disk can't fill memory with frames.
+
+    def __init__(self, directory, shape, block_size=1, every=1, batch_size=16, processes=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory        = directory
+        self.shape            = tuple(shape)
+        self.every            = every
+        self.batch_size       = batch_size
+        self.processes        = processes or os.cpu_count() or 1
+        self.pool             = Pool(self.processes, initializer=start_writer, initargs=(self.shape, block_size))
+        self.batch            = []
+        self.pending          = deque()
+        self.frames           = 0
+
+    def record(self, engine):
+        if engine.generation % self.every: return
+        self.batch.append((engine.generation, PackedGrid.from_array(engine.array).data))
+        if len(self.batch) >= self.batch_size: self.flush()
+
+    def flush(self):
+        if self.batch: self.pending.append(self.pool.apply_async(write_frames, (self.batch, self.directory, self.shape)))
+        self.batch = []
+        while len(self.pending) > 2 * self.processes: self.frames += self.pending.popleft().get()
+
+    def close(self):
+        self.flush()
+        while self.pending: self.frames += self.pending.popleft().get()
+        self.pool.close()
+        self.pool.join()
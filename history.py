@@ -0,0 +1,80 @@
+import numpy
+from collections import deque
+from packing import PackedGrid
+
+
+class History():
+
+    ## Every generation is stored as the flat indices it changed plus the values those
+    ## cells held before, so rewinding one generation only touches the changed cells.
+    ## A full copy of the grid is kept every keyframe_interval generations so that long
+    ## rewinds can jump to a keyframe instead of replaying every diff in between.
+    ## Keyframes are bit-packed at four cells per byte.
+
+    def __init__(self, depth=50, keyframe_interval=64, memory_budget=None):
+        self.depth            = depth
+        self.keyframe_interval= keyframe_interval
+        self.memory_budget    = memory_budget
+        self.clear()
+
+    def __len__(self):
+        return len(self.diffs)
+
+    def clear(self):
+        self.diffs            = deque()
+        self.keyframes        = {}
+        self.nbytes           = 0
+
+    def push(self, generation, changed_index, old_values, array):
+        index_type = numpy.int32 if array.size < 2**31 else numpy.int64
+        diff = (generation, changed_index.astype(index_type), old_values.astype(numpy.uint8))
+        self.diffs.append(diff)
+        self.nbytes += diff[1].nbytes + diff[2].nbytes
+        if self.keyframe_interval and generation % self.keyframe_interval == 0:
+            self.keyframes[generation] = PackedGrid.from_array(array)
+            self.nbytes += self.keyframes[generation].nbytes
+        self.trim()
+
+    def edit(self, generation, changed_index, old_values, value):
+        ## folds cells written between steps into the diff of the generation they were
+        ## written at, so rewinding past it restores them. Cells the diff already holds keep
+        ## their older value. A keyframe of generation takes the edit too, without a diff
+        ## for generation it is all there is to rewind to
+        if generation in self.keyframes: self.keyframes[generation].set(changed_index, numpy.full(len(changed_index), value))
+        if not self.diffs or self.diffs[-1][0] != generation: return
+        diff_generation, index, old = self.diffs[-1]
+        new = ~numpy.isin(changed_index, index)
+        added_index, added_old = changed_index[new].astype(index.dtype), old_values[new].astype(numpy.uint8)
+        self.diffs[-1] = (generation, numpy.concatenate([index, added_index]), numpy.concatenate([old, added_old]))
+        self.nbytes += added_index.nbytes + added_old.nbytes
+        self.trim()
+
+    def trim(self):
+        while self.diffs and (len(self.diffs) > self.depth or self.over_budget()):
+            generation, changed_index, old_values = self.diffs.popleft()
+            self.nbytes -= changed_index.nbytes + old_values.nbytes
+            for keyframe in [keyframe for keyframe in self.keyframes if keyframe < generation]:
+                self.nbytes -= self.keyframes.pop(keyframe).nbytes
+
+    def over_budget(self):
+        return self.memory_budget is not None and self.nbytes > self.memory_budget
+
+    def back(self, array, steps=1):
+        ## rewinds array in place, returns the generation it lands on and the cells that changed to reach it
+        steps = min(steps, len(self.diffs))
+        if not steps: return None
+        target = self.diffs[-1][0] - steps
+        keyframe = min((keyframe for keyframe in self.keyframes if keyframe >= target), default=None)
+        if keyframe is not None and self.diffs[-1][0] - keyframe > 0:
+            while self.diffs and self.diffs[-1][0] > keyframe:
+                generation, changed_index, old_values = self.diffs.pop()
+                self.nbytes -= changed_index.nbytes + old_values.nbytes
+            self.keyframes[keyframe].to_array(out=array)
+        while self.diffs and self.diffs[-1][0] > target:
+            generation, changed_index, old_values = self.diffs.pop()
+            self.nbytes -= changed_index.nbytes + old_values.nbytes
+            array.flat[changed_index] = old_values
+        for keyframe in [keyframe for keyframe in self.keyframes if keyframe > target]:
+            self.nbytes -= self.keyframes.pop(keyframe).nbytes
+        changed_index = self.diffs[-1][1] if self.diffs else numpy.zeros(0, dtype=numpy.intp)
+        return target, changed_index
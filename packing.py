@@ -0,0 +1,75 @@
+import numpy
+
+## Cells only take four states, so four of them fit in a byte: cell i of a byte sits in
+## bits 2*i and 2*i+1. The tables below decode or count a whole byte in one lookup.
+BYTES      = numpy.arange(256, dtype=numpy.uint8)
+UNPACK     = numpy.stack([(BYTES >> shift) & 3 for shift in (0, 2, 4, 6)], axis=1)
+COUNTS     = numpy.stack([(UNPACK == force).sum(axis=1) for force in range(4)], axis=1)
+
+
+def packed_size(size):
+    return (size + 3) // 4
+
+def pack(array, out=None):
+    flat = numpy.ravel(array)
+    if len(flat) % 4: flat = numpy.concatenate([flat, numpy.zeros(-len(flat) % 4, dtype=flat.dtype)])
+    quads = flat.reshape(-1, 4).astype(numpy.uint8, copy=False)
+    if out is None: out = numpy.empty(len(quads), dtype=numpy.uint8)
+    numpy.copyto(out, quads[:, 0])
+    for cell in (1, 2, 3): out |= quads[:, cell] << (2 * cell)
+    return out
+
+def unpack(packed, shape, out=None):
+    size = int(numpy.prod(shape))
+    if out is not None and size % 4 == 0:
+        numpy.take(UNPACK, packed, axis=0, out=out.reshape(-1, 4))
+        return out
+    cells = UNPACK[packed].ravel()[:size].reshape(shape)
+    if out is None: return cells
+    out[...] = cells
+    return out
+
+def get_cells(packed, index):
+    return (packed[index >> 2] >> ((index & 3) << 1).astype(numpy.uint8)) & 3
+
+def set_cells(packed, index, values):
+    ## index must not repeat, two writes to one cell would be OR-ed together
+    byte, shift = index >> 2, ((index & 3) << 1).astype(numpy.uint8)
+    numpy.bitwise_and.at(packed, byte, ~(numpy.uint8(3) << shift))
+    numpy.bitwise_or.at(packed, byte, numpy.asarray(values, dtype=numpy.uint8) << shift)
+
+def count_cells(packed, size):
+    counts = numpy.bincount(packed, minlength=256) @ COUNTS
+    counts[0] -= len(packed) * 4 - size
+    return counts
+
+
+class PackedGrid():
+
+    def __init__(self, shape, data=None):
+        self.shape            = tuple(shape)
+        self.size             = int(numpy.prod(self.shape))
+        self.data             = numpy.zeros(packed_size(self.size), dtype=numpy.uint8) if data is None else data
+
+    @classmethod
+    def from_array(cls, array):
+        return cls(array.shape, pack(array))
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def to_array(self, out=None):
+        return unpack(self.data, self.shape, out)
+
+    def update(self, array):
+        pack(array, self.data)
+
+    def get(self, index):
+        return get_cells(self.data, numpy.asarray(index))
+
+    def set(self, index, values):
+        set_cells(self.data, numpy.asarray(index), values)
+
+    def count(self):
+        return count_cells(self.data, self.size)
@@ -0,0 +1,78 @@
+import csv
+import json
+from time import perf_counter
+
+PHASES     = ('order', 'spread', 'frontier', 'population', 'record', 'history', 'render', 'population_bar')
+COUNTERS   = ('attempts', 'conversions', 'backfires', 'depth', 'changed', 'history_bytes')
+
+
+class Profiler():
+
+    ## Opt-in timings for one engine, switched on with engine.profiler = Profiler().
+    ## Each phase of a generation is timed with lap(), which charges the time since the
+    ## previous mark() or lap() to that phase. end_step() closes the generation and keeps
+    ## it as one row, so runs can be exported generation by generation. With no profiler
+    ## set, the engine only pays for an `if self.profiler` check per phase.
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.rows             = []
+        self.current          = self.new_row()
+        self.last             = perf_counter()
+
+    def new_row(self):
+        return dict.fromkeys(PHASES + COUNTERS, 0)
+
+    def mark(self):
+        self.last = perf_counter()
+
+    def lap(self, phase):
+        now = perf_counter()
+        self.current[phase] += now - self.last
+        self.last = now
+
+    def count(self, attempts=0, conversions=0, backfires=0, depth=0):
+        current = self.current
+        current['attempts'] += attempts
+        current['conversions'] += conversions
+        current['backfires'] += backfires
+        if depth > current['depth']: current['depth'] = depth
+
+    def end_step(self, engine):
+        self.current.update(generation=engine.generation, changed=len(engine.changed_index), history_bytes=engine.history.nbytes)
+        self.rows.append(self.current)
+        self.current = self.new_row()
+
+    def add_draw(self, phase, seconds):
+        ## the viewer draws on its own thread after end_step, so its time is passed in and
+        ## charged to the newest generation
+        if self.rows: self.rows[-1][phase] += seconds
+
+    def summary(self, last=None):
+        ## mean milliseconds per generation for every phase, mean counts, largest depth and history size
+        rows = self.rows[-last:] if last else self.rows
+        if not rows: return {}
+        summary = {f'{phase}_ms': sum(row[phase] for row in rows) / len(rows) * 1000 for phase in PHASES}
+        summary.update({name: sum(row[name] for row in rows) / len(rows) for name in ('attempts', 'conversions', 'backfires', 'changed')})
+        summary.update(depth=max(row['depth'] for row in rows), history_bytes=rows[-1]['history_bytes'], generations=len(rows))
+        return summary
+
+    def status_line(self, last=30):
+        summary = self.summary(last)
+        if not summary: return ''
+        phases = ' '.join(f"{phase} {summary[f'{phase}_ms']:.1f}" for phase in PHASES if summary[f'{phase}_ms'] >= 0.05)
+        return (f"{phases} ms | {summary['attempts']:.0f} attempts {summary['conversions']:.0f} conversions "
+                f"{summary['backfires']:.0f} backfires depth {summary['depth']} | history {summary['history_bytes'] / 2**20:.1f} MB")
+
+    def save(self, file):
+        ## .json holds the summary and every row, anything else is written as CSV with one row per generation
+        fields = ('generation',) + PHASES + COUNTERS
+        if file.endswith('.json'):
+            with open(file, 'w') as output: json.dump({'summary': self.summary(), 'rows': self.rows}, output, indent=1)
+            return
+        with open(file, 'w', newline='') as output:
+            writer = csv.DictWriter(output, fieldnames=fields, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(self.rows)
@@ -0,0 +1,112 @@
+import os
+import json
+import numpy
+from engine import SETTINGS
+from packing import pack, unpack, packed_size
+
+MAGIC = b'SIMTRAJ1'
+
+
+def frame_dtype(header):
+    if header.get('packing') == '2bit':
+        return numpy.dtype([('generation', '<i8'), ('grid', numpy.uint8, (packed_size(int(numpy.prod(header['shape']))),))])
+    return numpy.dtype([('generation', '<i8'), ('grid', numpy.uint8, tuple(header['shape']))])
+
+def read_header(file):
+    with open(file, 'rb') as trajectory:
+        if trajectory.read(len(MAGIC)) != MAGIC: raise ValueError(f'{file} is not a trajectory file')
+        length = int.from_bytes(trajectory.read(4), 'little')
+        header = json.loads(trajectory.read(length))
+    header['offset'] = len(MAGIC) + 4 + length
+    return header
+
+
+class Recorder():
+
+    ## Streams generations to an append-only file: a JSON header with the grid shape,
+    ## settings and seed, followed by fixed-size frames of (generation, grid). Frames
+    ## are written as they come, so nothing is held in memory between generations.
+    ## Packed frames store four cells per byte. Stepping back or editing the grid between
+    ## steps rewinds the file too, so it always holds the run as it finally went.
+
+    def __init__(self, file, engine, every=1, packed=True):
+        self.file             = file
+        self.every            = every
+        self.packed           = packed
+        self.start            = engine.generation
+        self.frames           = 0
+        header = {name: getattr(engine, name) for name in SETTINGS}
+        header.update(shape=list(engine.array.shape), rng_seed=engine.rng_seed, start=self.start, every=every,
+                      packing='2bit' if packed else 'uint8')
+        self.frame_size       = frame_dtype(header).itemsize
+        header = json.dumps(header).encode()
+        header += b' ' * (-(len(MAGIC) + 4 + len(header)) % 64)
+        self.offset           = len(MAGIC) + 4 + len(header)
+        self.output = open(file, 'wb')
+        self.output.write(MAGIC + len(header).to_bytes(4, 'little') + header)
+        self.record(engine)
+
+    def record(self, engine):
+        if engine.generation < self.start or (engine.generation - self.start) % self.every: return
+        self.output.write(numpy.int64(engine.generation).tobytes())
+        if self.packed: self.output.write(pack(engine.array).tobytes())
+        else: self.output.write(numpy.ascontiguousarray(engine.array, dtype=numpy.uint8).tobytes())
+        self.output.flush()
+        self.frames += 1
+
+    def rewind(self, engine):
+        ## drops the frames from engine.generation on and records that generation again
+        kept = min(self.frames, max(0, -(-(engine.generation - self.start) // self.every)))
+        self.output.seek(self.offset + kept * self.frame_size)
+        self.output.truncate()
+        self.frames = kept
+        self.record(engine)
+
+    def close(self):
+        self.output.close()
+
+
+class Trajectory():
+
+    ## Read side of a recording. Frames are memory-mapped, so seeking to any generation
+    ## only reads that frame from disk.
+
+    def __init__(self, file):
+        self.file             = file
+        self.header           = read_header(file)
+        self.shape            = tuple(self.header['shape'])
+        self.dtype            = frame_dtype(self.header)
+        self.refresh()
+
+    def refresh(self):
+        ## picks up frames appended since the file was opened, e.g. by a recorder still running
+        count = (os.path.getsize(self.file) - self.header['offset']) // self.dtype.itemsize
+        if count: self.frames = numpy.memmap(self.file, dtype=self.dtype, mode='r', offset=self.header['offset'], shape=(count,))
+        else: self.frames = numpy.zeros(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        if self.header.get('packing') == '2bit': return unpack(self.frames[index]['grid'], self.shape)
+        return self.frames[index]['grid']
+
+    def get_generations(self):
+        return self.frames['generation']
+
+    def seek(self, generation):
+        ## the last frame recorded at or before generation
+        generations = self.get_generations()
+        if generation < self.header['start'] or not len(generations): raise IndexError(f'generation {generation} was not recorded')
+        index = (generation - self.header['start']) // self.header['every']
+        if index >= len(generations) or generations[index] > generation:
+            index = numpy.flatnonzero(generations <= generation)[-1]
+        return self[index]
+
+    def load_into(self, engine, generation):
+        engine.load(numpy.array(self.seek(generation)))
+        for name in SETTINGS:
+            if name == 'direction_choices': engine.set_direction_choices(self.header[name])
+            else: setattr(engine, name, self.header[name])
+        engine.generation = generation
+        engine.count_population()
@@ -0,0 +1,42 @@
+import numpy
+from PIL import Image
+from packing import PackedGrid, UNPACK
+
+PALETTE = [[0,0,0,255], [0,128,21,255], [255,0,0,255], [255,221,51,255]]
+
+
+class Renderer():
+
+    def __init__(self, shape, block_size=5, palette=PALETTE):
+        self.block_size       = block_size
+        self.palette          = numpy.array(palette, dtype=numpy.uint8)
+        self.packed_palette   = self.palette[UNPACK]
+        self.set_shape(shape)
+
+    def set_shape(self, shape):
+        ## the array's first axis is drawn horizontally, so every buffer is transposed.
+        ## RGBA is the only colour mode PIL maps onto a numpy buffer instead of copying it
+        rows, columns    = shape
+        self.shape       = (rows, columns)
+        self.width       = rows * self.block_size
+        self.height      = columns * self.block_size
+        self.colors      = numpy.zeros((columns, rows, 4), dtype=numpy.uint8)
+        self.mask        = numpy.zeros((rows, columns), dtype=bool)
+        self.frame       = numpy.zeros((self.height, self.width, 4), dtype=numpy.uint8)
+        self.blocks      = self.frame.reshape(columns, self.block_size, rows, self.block_size, 4)
+        self.image       = Image.frombuffer('RGBA', (self.width, self.height), self.frame, 'raw', 'RGBA', 0, 1)
+
+    def render(self, array, changed_index=None):
+        ## array is a uint8 grid or a PackedGrid, which is decoded a byte at a time
+        if array.shape != self.shape: self.set_shape(array.shape)
+        if isinstance(array, PackedGrid):
+            colors = numpy.take(self.packed_palette, array.data, axis=0).reshape(-1, 4)[:array.size]
+            self.colors[...] = colors.reshape(array.shape + (4,)).transpose(1, 0, 2)
+        else: numpy.take(self.palette, array.T, axis=0, out=self.colors)
+        if changed_index is not None:
+            self.mask[:] = False
+            self.mask.flat[changed_index] = True
+            numpy.multiply(self.colors, self.mask.T[..., None], out=self.colors)
+            self.colors[..., 3] = 255
+        self.blocks[...] = self.colors[:, None, :, None, :]
+        return self.image
@@ -0,0 +1,80 @@
+import numpy
+import threading
+from contextlib import contextmanager
+from time import sleep, perf_counter
+
+
+class Runner():
+
+    ## Drives an engine from a worker thread so stepping never waits on drawing.
+    ## A program is a generator that does one unit of work (a step or a step back) per
+    ## iteration and yields how long to sleep afterwards. The viewer asks for frames with
+    ## take_frame(); the worker only copies the grid out when a frame was asked for, so
+    ## generations the viewer has no time to draw are never copied. Settings are changed
+    ## inside paused(), which holds the program between two steps.
+
+    def __init__(self, engine):
+        self.engine           = engine
+        self.lock             = threading.Lock()
+        self.thread           = None
+        self.program          = None
+        self.running          = False
+        self.frame            = None
+        self.frame_wanted     = True
+        self.buffers          = [None, None]
+        self.buffer_index     = 0
+        self.steps_per_sec    = 0.0
+
+    def start(self, program):
+        self.stop()
+        self.program = program
+        self.running = True
+        self.frame_wanted = True
+        self.thread = threading.Thread(target=self.loop, args=(program,), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread and self.thread is not threading.current_thread(): self.thread.join()
+        self.thread = None
+
+    @contextmanager
+    def paused(self):
+        ## a program stopped at a yield is between steps and carries on where it was
+        program = self.program if self.running else None
+        self.stop()
+        try: yield
+        finally:
+            if program: self.start(program)
+
+    def loop(self, program):
+        units, since = 0, perf_counter()
+        for delay in program:
+            if not self.running: break
+            units += 1
+            if self.frame_wanted: self.publish()
+            elapsed = perf_counter() - since
+            if elapsed > 0.5:
+                self.steps_per_sec, units, since = units / elapsed, 0, perf_counter()
+            if delay: sleep(delay)
+        self.publish()
+        self.running = False
+
+    def publish(self):
+        ## two buffers take turns: a frame still waiting to be taken is overwritten in
+        ## place, otherwise the buffer the viewer was handed last is left alone
+        engine = self.engine
+        with self.lock:
+            if self.frame is None: self.buffer_index = 1 - self.buffer_index
+            buffer = self.buffers[self.buffer_index]
+            if buffer is None or buffer.shape != engine.array.shape:
+                buffer = self.buffers[self.buffer_index] = numpy.empty_like(engine.array)
+            numpy.copyto(buffer, engine.array)
+            self.frame = (buffer, engine.changed_index.copy(), list(engine.get_population()), engine.generation)
+            self.frame_wanted = False
+
+    def take_frame(self):
+        with self.lock:
+            frame, self.frame = self.frame, None
+            self.frame_wanted = True
+        return frame
@@ -0,0 +1,60 @@
+import numpy
+
+## Every strategy returns a grid of the species to place, 0 where the grid is left as it
+## is. Each one is a few whole-array operations, so seeding costs the same per cell on any
+## grid size. Species 1, 2 and 3 are green, red and yellow.
+
+
+def scatter(rng, shape, count=100):
+    ## count cells in random places, a cell drawn twice keeps its last species
+    x = rng.integers(shape[0], size=count)
+    y = rng.integers(shape[1], size=count)
+    grid = numpy.zeros(shape, dtype=numpy.uint8)
+    grid[x, y] = rng.integers(1, 4, size=count)
+    return grid
+
+def uniform(rng, shape, fraction=0.1):
+    ## every cell is taken with probability fraction
+    species = rng.integers(1, 4, size=shape, dtype=numpy.uint8)
+    return numpy.where(rng.random(shape) < fraction, species, numpy.uint8(0))
+
+def blobs(rng, shape, count=20, radius=10, fraction=1.0, wrap=False):
+    ## count discs of one species each, with a random radius up to radius
+    rows, columns = shape
+    offsets_x, offsets_y = numpy.mgrid[-radius:radius + 1, -radius:radius + 1].reshape(2, -1)
+    x = rng.integers(rows, size=count)[:, None] + offsets_x
+    y = rng.integers(columns, size=count)[:, None] + offsets_y
+    radii = rng.integers(1, radius + 1, size=count)[:, None]
+    species = numpy.broadcast_to(rng.integers(1, 4, size=count, dtype=numpy.uint8)[:, None], x.shape)
+    inside = (offsets_x**2 + offsets_y**2 <= radii**2) & (rng.random(x.shape) < fraction)
+    if wrap: x, y = x % rows, y % columns
+    else: inside &= (x >= 0) & (x < rows) & (y >= 0) & (y < columns)
+    grid = numpy.zeros(shape, dtype=numpy.uint8)
+    grid[x[inside], y[inside]] = species[inside]
+    return grid
+
+def stripes(rng, shape, width=10, axis=0, fraction=1.0):
+    ## bands width cells wide across axis, cycling through the species in a random order
+    position = numpy.arange(shape[axis]) + rng.integers(3 * width)
+    line = (rng.permutation(3) + 1).astype(numpy.uint8)[(position // width) % 3]
+    grid = numpy.broadcast_to(line[:, None] if axis == 0 else line[None, :], shape)
+    return numpy.where(rng.random(shape) < fraction, grid, numpy.uint8(0))
+
+def voronoi(rng, shape, count=12, fraction=1.0, wrap=False):
+    ## count random sites, every cell takes the species of the nearest site
+    rows, columns = shape
+    sites_x, sites_y = rng.integers(rows, size=count), rng.integers(columns, size=count)
+    species = rng.integers(1, 4, size=count, dtype=numpy.uint8)
+    x, y = numpy.arange(rows)[:, None], numpy.arange(columns)[None, :]
+    nearest = numpy.full(shape, numpy.iinfo(numpy.int64).max)
+    grid = numpy.zeros(shape, dtype=numpy.uint8)
+    for site_x, site_y, force in zip(sites_x, sites_y, species):
+        x_distance, y_distance = numpy.abs(x - site_x), numpy.abs(y - site_y)
+        if wrap: x_distance, y_distance = numpy.minimum(x_distance, rows - x_distance), numpy.minimum(y_distance, columns - y_distance)
+        distance = x_distance**2 + y_distance**2
+        closer = distance < nearest
+        nearest[closer] = distance[closer]
+        grid[closer] = force
+    return numpy.where(rng.random(shape) < fraction, grid, numpy.uint8(0))
+
+SEEDINGS   = {'scatter': scatter, 'uniform': uniform, 'blobs': blobs, 'stripes': stripes, 'voronoi': voronoi}
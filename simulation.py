@@ -1,46 +1,44 @@
+import csv
+import json
+import inspect
+import argparse
 import tkinter
-import numpy
-import random
-from time import sleep, time
 from tkinter import filedialog
-from itertools import permutations
-from PIL import Image, ImageTk
+from PIL import ImageTk
+from engine import Engine, KERNELS, EDGES, DIRECTIONS
+from renderer import Renderer
+from recorder import Recorder
+from runner import Runner
+from profiler import Profiler
+from detector import Detector
+from time import perf_counter
+from frames import FrameWriter
+from seeding import SEEDINGS
 
 
 class Simulation():
 
-    def __init__(self):
-        self.array            = self.create_array()
-        self.array_rows       = [row for row in range(self.array.shape[0])]
-        self.array_columns    = [column for column in range(self.array.shape[1])]
-        self.height           = 500
-        self.width            = 500
+    def __init__(self, engine=None, block_size=5):
+        self.engine           = engine if engine is not None else Engine()
+        self.block_size       = block_size
+        self.renderer         = Renderer(self.engine.array.shape, block_size)
         self.window           = self.create_window()
+        self.set_size()
         self.canvas           = self.create_canvas()
-        self.block_size       = 5
-        self.last_states      = []
-        self.seed             = []
-        self.seed_density     = 100
-        self.auto_running     = False
-        self.faster_eating    = False
-        self.random_spread    = True
-        self.random_iter_order= True
-        self.single_change    = True
+        self.runner           = Runner(self.engine)
+        if self.engine.detector is None: self.engine.detector = Detector()
+        self.fps              = 30
+        self.poll_id          = None
         self.only_draw_changes= False
-        self.recursion_factor = 0
-        self.spread_factor    = 1
-        self.direction_choices= [-1, -1, 0, 1, 1]
-        self.direction_options= list(dict.fromkeys(list(permutations(self.direction_choices, 2))))
-        self.spin             = random.randint(0, len(self.direction_options)-1)
-        self.population       = [0,0,0,0]
-        self.changed_cells    = {}
-        self.color_dict       = {0: [0,0,0], 1: [0,128,21], 2: [255,0,0], 3: [255,221,51]}
-        self.forces_iter_dict = {1:Spreader.iterate, 2: Eater.iterate, 3: Cleaner.iterate}
         self.population_bar   = self.create_population_bar()
+        self.population_rectangles = None
         self.spread_slider    = self.create_spread_slider()
         self.recursion_slider = self.create_recursion_slider()
         self.canvas_image     = None
-        self.image_array      = numpy.ndarray(shape=(100,100,3), dtype=numpy.uint8)
+        self.status_line      = None
+        self.brush_radius     = 10
+        self.brush_shape      = 'square'
+        self.paint_force      = 1
         self.bind_keys()
         self.create_buttons()
         self.create_menu()
@@ -51,17 +49,26 @@ class Simulation():
         window.geometry('+100+0')
         return window
 
+    def set_size(self):
+        self.renderer.set_shape(self.engine.array.shape)
+        self.width       = self.renderer.width
+        self.height      = self.renderer.height
+        self.canvas_image= None
+
+    def resize(self):
+        self.set_size()
+        self.clear_canvas()
+        self.canvas.config(height=self.height, width=self.width)
+        self.population_bar.config(width=self.width)
+
     def create_canvas(self):
         canvas = tkinter.Canvas(self.window, bg="black", height=self.height, width=self.width)
         canvas.grid(rowspan=2, columnspan=6)
         return canvas
 
-    def create_array(self):
-        array = numpy.zeros((100, 100), dtype=numpy.uint8)
-        return array
-
     def clear_canvas(self):
         self.canvas.delete("all")
+        self.canvas_image = None
 
     def create_buttons(self):
         tkinter.Button(self.window, text='Auto>', borderwidth=1, font=('Verdana','18'),
@@ -80,6 +87,7 @@ class Simulation():
         view_menu = tkinter.Menu(menu_bar)
         view_menu.add_command(label='Save                  Ctrl-S', command=lambda: self.save_state())
         view_menu.add_command(label='Load                  Ctrl-L', command=lambda: self.load_state())
+        view_menu.add_command(label='Start/Stop Recording  Ctrl-R', command=lambda: self.toggle_recording())
         view_menu.add_command(label='Toggle recursive eating    R', command=lambda: self.toggle_recursive_eating())
         view_menu.add_command(label='Toggle spread direction    D', command=lambda: self.toggle_direction_choice())
         view_menu.add_command(label='Toggle add reverse eating  F', command=lambda: self.toggle_faster_eating())
@@ -87,22 +95,30 @@ class Simulation():
         view_menu.add_command(label='Toggle random order        Z', command=lambda: self.toggle_random_iter())
         view_menu.add_command(label='Toggle only change once    C', command=lambda: self.toggle_only_change_once())
         view_menu.add_command(label='Toggle only draw changed   V', command=lambda: self.toggle_draw_changes_only())
+        view_menu.add_command(label='Next kernel                K', command=lambda: self.toggle_kernel())
+        view_menu.add_command(label='Toggle wrapping edges      W', command=lambda: self.toggle_edges())
+        view_menu.add_command(label='Toggle profiling           P', command=lambda: self.toggle_profiling())
+        view_menu.add_command(label='Save Profile'                , command=lambda: self.save_profile())
         view_menu.add_command(label='Default Settings     Shift-D', command=lambda: self.set_defaults())
         view_menu.add_command(label='Reset                Shift-R', command=lambda: self.reset())
         view_menu.add_command(label='New                  Shift-N', command=lambda: self.new_simulation())
         view_menu.add_command(label='Set Seed Density'            , command=lambda: self.set_seed_density())
         menu_bar.add_cascade(label="Simulation options", menu=view_menu)
+        seed_menu = tkinter.Menu(menu_bar)
+        for seeding in SEEDINGS:
+            seed_menu.add_command(label=seeding.capitalize(), command=lambda seeding=seeding: self.set_seeding(seeding))
+        menu_bar.add_cascade(label="Seeding", menu=seed_menu)
         self.window.config(menu=menu_bar)
 
     def create_spread_slider(self):
         spread_slider = tkinter.Scale(self.window, from_=8, to= 1, command=lambda x: self.get_spread_from_slider())
-        spread_slider.set(self.spread_factor)
+        spread_slider.set(self.engine.spread_factor)
         spread_slider.grid(row=0, column=7)
         return spread_slider
 
     def create_recursion_slider(self):
         recursion_slider = tkinter.Scale(self.window, from_=8, to= 0, command=lambda x: self.get_recursion_from_slider())
-        recursion_slider.set(self.recursion_factor)
+        recursion_slider.set(self.engine.recursion_factor)
         recursion_slider.grid(row=1, column=7)
         return recursion_slider
 
@@ -113,6 +129,7 @@ class Simulation():
 
     def clear_population_bar(self):
         self.population_bar.delete("all")
+        self.population_rectangles = None
 
     def bind_keys(self):
         self.window.bind("<KeyPress-Right>", lambda x: self.step())
@@ -123,6 +140,13 @@ class Simulation():
         self.window.bind("N", lambda x: self.new_simulation())
         self.window.bind("2", lambda x: self.two_steps_one_back())
         self.window.bind("<Button-3>", lambda x: self.nuke(x))
+        self.canvas.bind("<Button-1>", lambda x: self.paint(x))
+        self.canvas.bind("<B1-Motion>", lambda x: self.paint(x))
+        self.canvas.bind("<Button-2>", lambda x: self.fill(x))
+        self.window.bind("[", lambda x: self.set_brush_radius(-1))
+        self.window.bind("]", lambda x: self.set_brush_radius(1))
+        self.window.bind("o", lambda x: self.toggle_brush_shape())
+        self.window.bind("s", lambda x: self.toggle_paint_force())
         self.window.bind("f", lambda x: self.toggle_faster_eating())
         self.window.bind("r", lambda x: self.toggle_recursive_eating())
         self.window.bind("d", lambda x: self.toggle_direction_choice())
@@ -135,102 +159,125 @@ class Simulation():
         self.window.bind(",", lambda x: self.set_recursion_factor(-1))
         self.window.bind("D", lambda x: self.set_defaults())
         self.window.bind("v", lambda x: self.toggle_draw_changes_only())
+        self.window.bind("k", lambda x: self.toggle_kernel())
+        self.window.bind("w", lambda x: self.toggle_edges())
+        self.window.bind("p", lambda x: self.toggle_profiling())
         self.window.bind("<KeyPress-Up>", lambda x: self.set_spin(1))
         self.window.bind("<KeyPress-Down>", lambda x: self.set_spin(-1))
         self.window.bind("<Control-s>", lambda x: self.save_state())
         self.window.bind("<Control-l>", lambda x: self.load_state())
+        self.window.bind("<Control-r>", lambda x: self.toggle_recording())
 
     def mainloop(self):
         self.window.mainloop()
 
     def set_seed(self):
-        for i in range(self.seed_density):
-            x, y = random.choice(range(self.array.shape[0])), random.choice(range(self.array.shape[1]))
-            force = random.choice([1,2,3])
-            self.array[x][y] = force
-        self.seed = self.array.copy()
+        self.pause()
+        self.engine.set_seed()
 
     def set_seed_density(self):
 
         def get_density(entry):
             try: 
-                seed_density =  min(abs(int(entry.get())), 10000)
-                self.seed_density = seed_density
+                seed_density =  min(abs(int(entry.get())), self.engine.array.size)
+                self.engine.seed_density = seed_density
                 window.destroy()
             except ValueError: pass
 
         window = tkinter.Toplevel()
         window.bind('<Return>', lambda x: get_density(entry))
-        tkinter.Label(window, text='Enter Seed Density (0-10000)').pack()
+        tkinter.Label(window, text=f'Enter Seed Density (0-{self.engine.array.size})').pack()
         entry = tkinter.Entry(window)
         entry.focus_set()
         entry.pack()
         tkinter.Button(window, text='Set Density', command=lambda: get_density(entry)).pack()
 
-    def draw(self):
-        self.clear_canvas()
-        for position, square in numpy.ndenumerate(self.array):
-            if self.only_draw_changes:
-                if (position[0], position[1]) not in self.changed_cells:
-                    square = 0 
-            self.image_array[position[1],position[0], :] = self.color_dict[square]
-        image_array = numpy.repeat(numpy.repeat(self.image_array,5, axis=0), 5, axis=1)
-        sized_array = Image.fromarray(image_array, mode='RGB')
-        self.canvas_image = ImageTk.PhotoImage(sized_array)
-        self.canvas.create_image(250,250,image=self.canvas_image)
-        self.draw_population_bar()
-
-    def iterate(self):
-        self.changed_cells = {}
-        if self.random_iter_order:
-            random.shuffle(self.array_rows)
-            random.shuffle(self.array_columns)
-        for x in self.array_rows:
-            for y in self.array_columns:
-                force = self.array[x, y]
-                if force in {0}: continue
-                condition = (x, y) not in self.changed_cells if self.single_change else True
-                if condition:
-                    self.forces_iter_dict[force](x, y, self.recursion_factor)
-
-    def append_last_states(self):
-        self.last_states.append((self.array.copy(), self.changed_cells.copy()))
-        if len(self.last_states) > 50: 
-            self.last_states.remove(self.last_states[0])
+    def draw(self, frame=None):
+        ## frame is (array, changed_index, population, generation) handed over by the runner
+        array, changed_index, population, generation = frame or (self.engine.array, self.engine.changed_index,
+                                                                 self.engine.get_population(), self.engine.generation)
+        since = perf_counter()
+        image = self.renderer.render(array, changed_index if self.only_draw_changes else None)
+        if self.canvas_image is None:
+            self.canvas_image = ImageTk.PhotoImage(image)
+            self.canvas.create_image(self.width // 2, self.height // 2, image=self.canvas_image)
+        else:
+            self.canvas_image.paste(image)
+        rendered = perf_counter()
+        self.draw_population_bar(population)
+        profiler = self.engine.profiler
+        if profiler:
+            profiler.add_draw('render', rendered - since)
+            profiler.add_draw('population_bar', perf_counter() - rendered)
+            self.status_line.config(text=profiler.status_line())
 
     def step(self):
         ## bound to <Right Arrow Key>
-        self.append_last_states()
-        self.iterate()
+        self.pause()
+        self.engine.step()
         self.draw()
 
     def back(self):
         ## bound to <Left Arrow Key>
-        if self.last_states:
-            self.array, self.changed_cells = self.last_states[-1]
-            self.last_states.pop()
+        self.pause()
+        if self.engine.back():
             self.draw()
 
+    def pause(self):
+        self.runner.stop()
+        self.window.title('Simulation')
+
+    def run_program(self, program):
+        ## the engine advances on the runner's thread, the window pulls the newest frame at self.fps
+        if self.runner.running: return self.pause()
+        self.runner.start(program)
+        ## after a quick pause the previous chain is still pending and picks the new run up
+        if self.poll_id is None: self.poll_id = self.window.after(0, self.poll_frame)
+
+    def poll_frame(self):
+        self.poll_id = None
+        frame = self.runner.take_frame()
+        if frame: self.draw(frame)
+        if self.runner.running:
+            self.window.title(f'Simulation - {self.runner.steps_per_sec:.0f} steps/s')
+            self.poll_id = self.window.after(1000 // self.fps, self.poll_frame)
+        elif self.engine.detector.outcome: self.window.title(f'Simulation - {self.engine.detector.describe()}')
+        else: self.window.title('Simulation')
+
+    def forward_program(self):
+        ## stops when the run is decided, pressing play again carries on until the outcome changes
+        while True:
+            self.engine.step()
+            if self.engine.detector.decided_at == self.engine.generation:
+                print(self.engine.detector.describe())
+                return
+            yield 0
+
+    def backward_program(self):
+        while self.engine.back():
+            yield 0.01
+
+    def two_steps_one_back_program(self):
+        while True:
+            for step in range(8):
+                self.engine.step()
+                yield 0
+            for back in range(4):
+                self.engine.back()
+                yield 0.01
+
     def auto_run(self):
         ## bound to <Spacebar>
-        self.auto_running = not self.auto_running
-        while self.auto_running:
-            self.step()
-            self.window.update()
+        self.run_program(self.forward_program())
 
     def auto_back(self):
         ## bound to <b>
-        self.auto_running = not self.auto_running
-        while self.auto_running:
-            self.back()
-            sleep(0.01)
-            self.window.update()
-            if not self.last_states: self.auto_running = False
+        self.run_program(self.backward_program())
 
     def reset(self):
         ## bound to <Shift-R>
-        self.array = self.seed.copy()
-        self.last_states = []
+        self.pause()
+        self.engine.reset()
         setting = True if self.only_draw_changes else False
         self.only_draw_changes = False
         self.draw()
@@ -239,60 +286,71 @@ class Simulation():
 
     def save_state(self):
         file = filedialog.asksaveasfilename(initialdir= ".\Save Files",title= "Save As",
-                                      filetypes = (('numpy files', '*.npy'),('All files', '*.*')))
-        numpy.save(f'{file}', self.array)
+                                      filetypes = (('numpy files', '*.npz'),('All files', '*.*')))
+        if not file: return
+        self.engine.save(file)
     
     def load_state(self):
-        self.auto_running = False
+        self.pause()
         self.set_defaults()
         file = filedialog.askopenfilename(initialdir= ".\Save Files",
                                       title     = "Select a File",
-                                      filetypes = (('numpy files', '*.npy'),('All files', '*.*')))
+                                      filetypes = (('numpy files', '*.npz *.npy'),('All files', '*.*')))
         if not file: return
-        self.array = numpy.load(file)
-        self.seed = self.array.copy()
+        self.engine.load_file(file)
+        self.spread_slider.set(self.engine.spread_factor)
+        self.recursion_slider.set(self.engine.recursion_factor)
+        self.resize()
         self.draw()
 
+    def toggle_recording(self):
+        ## bound to <Ctrl-R>
+        self.pause()
+        if self.engine.recorder:
+            self.engine.recorder.close()
+            print(f'recording stopped, {self.engine.recorder.frames} frames in {self.engine.recorder.file}')
+            self.engine.recorder = None
+            return
+        file = filedialog.asksaveasfilename(initialdir= ".\Save Files",title= "Record To",
+                                      filetypes = (('trajectory files', '*.traj'),('All files', '*.*')))
+        if not file: return
+        self.engine.recorder = Recorder(file, self.engine)
+        print(f'recording to {file}')
+
     def two_steps_one_back(self):
         ## bound to <2>
-        self.auto_running = not self.auto_running
-        while self.auto_running:
-            for step in range(8):
-                self.step()
-                self.window.update()
-            for back in range(4):
-                self.back()
-                sleep(0.01)
-                self.window.update()
+        self.run_program(self.two_steps_one_back_program())
 
     def toggle_faster_eating(self):
         ## bound to <f>
-        self.faster_eating = not self.faster_eating
-        print(f"faster eating = {'ON' if self.faster_eating else 'OFF'}")
+        with self.runner.paused():
+            self.engine.faster_eating = not self.engine.faster_eating
+            print(f"faster eating = {'ON' if self.engine.faster_eating else 'OFF'}")
 
     def toggle_recursive_eating(self):
         ## bound to <r>
-        self.recursion_factor = 0 if self.recursion_factor else 1
-        self.recursion_slider.set(self.recursion_factor)
-        print(f"recursive eating = {'ON' if self.recursion_factor else 'OFF'}")
+        with self.runner.paused():
+            self.engine.recursion_factor = 0 if self.engine.recursion_factor else 1
+            self.recursion_slider.set(self.engine.recursion_factor)
+            print(f"recursive eating = {'ON' if self.engine.recursion_factor else 'OFF'}")
 
     def toggle_direction_choice(self):
         ## bound to <d>
-        if 0 in self.direction_choices:self.direction_choices.remove(0)
-        else: self.direction_choices.append(0)
-        self.direction_options= list(dict.fromkeys(list(permutations(self.direction_choices, 2))))
-        self.spin = random.randint(0, len(simulation.direction_options)-1)
-        print(f'directions = {"ALL" if 0 in self.direction_choices else "DIAGONAL"}')
+        with self.runner.paused():
+            self.engine.toggle_direction_choice()
+            print(f'directions = {"ALL" if 0 in self.engine.direction_choices else "DIAGONAL"}')
 
     def toggle_random_spread(self):
         ## bound to <x>
-        self.random_spread = not self.random_spread
-        print(f"random spreading = {'ON' if self.random_spread else 'OFF'}")
+        with self.runner.paused():
+            self.engine.random_spread = not self.engine.random_spread
+            print(f"random spreading = {'ON' if self.engine.random_spread else 'OFF'}")
 
     def toggle_random_iter(self):
         ## bound to <z>
-        self.random_iter_order = not self.random_iter_order
-        print(f"random iter order = {'ON' if self.random_iter_order else 'OFF'}")
+        with self.runner.paused():
+            self.engine.random_iter_order = not self.engine.random_iter_order
+            print(f"random iter order = {'ON' if self.engine.random_iter_order else 'OFF'}")
 
     def toggle_draw_changes_only(self):
         ## bound to <v>
@@ -301,178 +359,251 @@ class Simulation():
 
     def toggle_only_change_once(self):
         ## bound to <c>
-        self.single_change = not self.single_change
-        print(f"only change once = {'ON' if self.single_change else 'OFF'}")
+        with self.runner.paused():
+            self.engine.single_change = not self.engine.single_change
+            print(f"only change once = {'ON' if self.engine.single_change else 'OFF'}")
+
+    def toggle_kernel(self):
+        ## bound to <k>
+        with self.runner.paused():
+            self.engine.kernel = KERNELS[(KERNELS.index(self.engine.kernel) + 1) % len(KERNELS)]
+            print(f"kernel = {self.engine.kernel.upper()}")
+
+    def toggle_edges(self):
+        ## bound to <w>
+        with self.runner.paused():
+            self.engine.edges = 'clip' if self.engine.edges == 'wrap' else 'wrap'
+            print(f"edges = {self.engine.edges.upper()}")
+
+    def toggle_profiling(self):
+        ## bound to <p>
+        self.pause()
+        if self.engine.profiler:
+            self.engine.profiler = None
+            self.status_line.grid_remove()
+        else:
+            self.engine.profiler = Profiler()
+            if self.status_line is None: self.status_line = tkinter.Label(self.window, anchor='w', font=('Courier', '9'))
+            self.status_line.config(text='')
+            self.status_line.grid(row=4, columnspan=8, sticky='we')
+        print(f"profiling = {'ON' if self.engine.profiler else 'OFF'}")
+
+    def save_profile(self):
+        if not self.engine.profiler: return print('profiling is off, press p to start it')
+        file = filedialog.asksaveasfilename(initialdir= ".\Save Files",title= "Save Profile",
+                                      filetypes = (('csv files', '*.csv'),('json files', '*.json'),('All files', '*.*')))
+        if not file: return
+        self.engine.profiler.save(file)
 
     def set_spread_factor(self, sign):
         ## bound to <+><->
-        self.spread_factor += sign
-        if self.spread_factor == 9: self.spread_factor = 1
-        if self.spread_factor == 0: self.spread_factor = 8
-        self.spread_slider.set(self.spread_factor)
-        print(f'spread_factor = {self.spread_factor}')
+        with self.runner.paused():
+            self.engine.spread_factor += sign
+            if self.engine.spread_factor == 9: self.engine.spread_factor = 1
+            if self.engine.spread_factor == 0: self.engine.spread_factor = 8
+            self.spread_slider.set(self.engine.spread_factor)
+            print(f'spread_factor = {self.engine.spread_factor}')
 
     def get_spread_from_slider(self):
-        self.spread_factor = self.spread_slider.get()
+        with self.runner.paused():
+            self.engine.spread_factor = self.spread_slider.get()
 
     def set_recursion_factor(self, sign):
         ## bound to <<>>
-        self.recursion_factor += sign
-        if self.recursion_factor == 9: self.recursion_factor = 0
-        if self.recursion_factor < 0: self.recursion_factor = 8
-        self.recursion_slider.set(self.recursion_factor)
-        print(f'recursion_factor = {self.recursion_factor}')
+        with self.runner.paused():
+            self.engine.recursion_factor += sign
+            if self.engine.recursion_factor == 9: self.engine.recursion_factor = 0
+            if self.engine.recursion_factor < 0: self.engine.recursion_factor = 8
+            self.recursion_slider.set(self.engine.recursion_factor)
+            print(f'recursion_factor = {self.engine.recursion_factor}')
 
     def get_recursion_from_slider(self):
-        self.recursion_factor = self.recursion_slider.get()
+        with self.runner.paused():
+            self.engine.recursion_factor = self.recursion_slider.get()
 
     def set_spin(self, sign):
         ## bound to <KeyPress-Up> <KeyPress-Down>
-        simulation.spin += sign
-        if self.spin == len(self.direction_options): self.spin = 0
-        if self.spin < 0: self.spread_factor = len(self.direction_options) - 1
-        print(f'spin = {self.spin}')
+        with self.runner.paused():
+            self.engine.set_spin(sign)
+            print(f'spin = {self.engine.spin}')
 
     def set_defaults(self):
         ## bound to <Shift-D>
-        self.faster_eating = False
-        self.random_spread = True
-        self.random_iter_order = True
-        self.single_change = True
-        self.recursion_factor = 0
-        self.spread_factor = 1
-        self.direction_choices = [-1, -1, 0, 1, 1]
-        self.direction_options= list(dict.fromkeys(list(permutations(self.direction_choices, 2))))
-        self.spin = random.randint(0, len(simulation.direction_options)-1)
-        self.changed_cells = {}
-        self.spread_slider.set(self.spread_factor)
-        self.recursion_slider.set(self.recursion_factor)
-        self.array_rows       = [row for row in range(self.array.shape[0])]
-        self.array_columns    = [column for column in range(self.array.shape[1])]
-        print('SETTINGS RESET')
+        with self.runner.paused():
+            self.engine.set_defaults()
+            self.spread_slider.set(self.engine.spread_factor)
+            self.recursion_slider.set(self.engine.recursion_factor)
+            print('SETTINGS RESET')
 
     def new_simulation(self):
         ## bound to <Shift-N>
-        self.array = self.create_array()
-        self.auto_running = False
-        self.last_states = []
+        self.pause()
         self.clear_canvas()
         self.clear_population_bar()
+        self.engine.new_simulation()
         self.set_defaults()
-        self.set_seed()
         self.draw()
 
+    def get_mouse_cell(self, mouse_click):
+        return round((mouse_click.x)/self.block_size), round((mouse_click.y)/self.block_size)
+
     def nuke(self, mouse_click):
         ## bound to <Mouse Button 3>
-        nuke_radius = 10
-        array_x, array_y = round((mouse_click.x)/5), round((mouse_click.y)/5)
-        for row in range(array_x - nuke_radius, array_x + nuke_radius):
-            for column in range(array_y - 10, array_y + 10):
-                try: self.array[max(row, 0), max(column, 0)] = 0
-                except IndexError: continue
+        self.pause()
+        self.engine.nuke(*self.get_mouse_cell(mouse_click), self.brush_radius, self.brush_shape)
         self.draw()
-        self.window.update()
 
-    def get_population(self):
-        for force in range(len(self.population)):
-            count = len(self.array[numpy.where(self.array == force)])
-            self.population[force] = count
+    def paint(self, mouse_click):
+        ## bound to <Mouse Button 1>, drag to keep painting
+        self.pause()
+        self.engine.paint(*self.get_mouse_cell(mouse_click), self.paint_force, self.brush_radius, self.brush_shape)
+        self.draw()
 
-    def draw_population_bar(self):
-        self.clear_population_bar()
-        self.get_population()
-        max_population = self.array.shape[0] * self.array.shape[1]
-        green_width  = self.population[1] / max_population * self.width
-        red_width    = self.population[2] / max_population * self.width
-        yellow_width = self.population[3] / max_population * self.width
-        self.population_bar.create_rectangle(0, 0, green_width, 20, fill='#007f15')
-        self.population_bar.create_rectangle(green_width, 0, green_width+red_width, 20, fill='red')
-        self.population_bar.create_rectangle(green_width+red_width, 0, green_width+red_width+yellow_width, 20, fill='#ffdd32')
-
-class Forces():
-    
-    def is_valid_index(target_x, target_y):
-            return target_x not in {-1,100} and target_y not in {-1,100}
-
-class Spreader(Forces):
-    def iterate(array_x_pos, array_y_pos, recursion_factor):
-        index = int(random.random() * len(simulation.direction_options)) if simulation.random_spread else simulation.spin
-        directions = simulation.direction_options * 2
-        backfires = set()
-        for spread in range(simulation.spread_factor):
-            x_direction, y_direction = directions[index-spread]
-            target_x, target_y = array_x_pos + x_direction, array_y_pos + y_direction
-            if not Forces.is_valid_index(target_x, target_y): continue
-            if simulation.array[target_x, target_y] in {0,3}:
-                simulation.array[target_x, target_y] = 1
-                simulation.changed_cells[(target_x, target_y)] = 1
-                if simulation.recursion_factor and spread < 1:
-                    if int(random.random() * (recursion_factor + 1)) > 0:
-                        recursion_factor -= 1
-                        Spreader.iterate(target_x, target_y, recursion_factor)
-            if simulation.faster_eating:
-                if simulation.array[target_x, target_y] == 2:
-                    backfires.add((array_x_pos, array_y_pos))
-                if spread + 1 == simulation.spread_factor:
-                    for backfire in backfires:
-                        simulation.array[array_x_pos, array_y_pos] = 2
-                        simulation.changed_cells[(array_x_pos, array_y_pos)] = 2
-
-class Eater(Forces):
-    def iterate(array_x_pos, array_y_pos, recursion_factor):
-        index = int(random.random() * len(simulation.direction_options)) if simulation.random_spread else simulation.spin
-        directions = simulation.direction_options * 2
-        backfires = set()
-        for spread in range(simulation.spread_factor):
-            x_direction, y_direction = directions[index-spread]
-            target_x, target_y = array_x_pos + x_direction, array_y_pos + y_direction
-            if not Forces.is_valid_index(target_x, target_y): continue
-            if simulation.array[target_x, target_y] in {0,1}:
-                if simulation.array[target_x, target_y] == 0:
-                    simulation.array[array_x_pos, array_y_pos] = 0
-                    simulation.changed_cells[(array_x_pos, array_y_pos)] = 0
-                simulation.array[target_x, target_y] = 2
-                simulation.changed_cells[(target_x, target_y)] = 2
-                if simulation.recursion_factor and spread < 1:
-                    if int(random.random() * (recursion_factor + 1)) > 0:
-                        recursion_factor -= 1
-                        Eater.iterate(target_x, target_y, recursion_factor)
-            if simulation.faster_eating:
-                if simulation.array[target_x, target_y] == 3:
-                    backfires.add((array_x_pos, array_y_pos))
-                if spread + 1 == simulation.spread_factor:
-                    for backfire in backfires:
-                        simulation.array[array_x_pos, array_y_pos] = 3
-                        simulation.changed_cells[(array_x_pos, array_y_pos)] = 3
-
-class Cleaner(Forces):
-    def iterate(array_x_pos, array_y_pos, recursion_factor):
-        index = int(random.random() * len(simulation.direction_options)) if simulation.random_spread else simulation.spin
-        directions = simulation.direction_options * 2
-        backfires = set()
-        for spread in range(simulation.spread_factor):
-            x_direction, y_direction = directions[index-spread]
-            target_x, target_y = array_x_pos + x_direction, array_y_pos + y_direction
-            if not Forces.is_valid_index(target_x, target_y): continue
-            if simulation.array[target_x, target_y] in {0,2}:
-                simulation.array[target_x, target_y] = 3
-                simulation.changed_cells[(target_x, target_y)] = 3
-                if simulation.recursion_factor and spread < 1:
-                    if int(random.random() * (recursion_factor + 1)) > 0:
-                        recursion_factor -= 1
-                        Cleaner.iterate(target_x, target_y, recursion_factor)
-            if simulation.faster_eating:
-                if simulation.array[target_x, target_y] == 1:
-                    backfires.add((array_x_pos, array_y_pos))
-                if spread + 1 == simulation.spread_factor:
-                    for backfire in backfires:
-                        simulation.array[array_x_pos, array_y_pos] = 1
-                        simulation.changed_cells[(array_x_pos, array_y_pos)] = 1
-
-def main():
-    global simulation
-    simulation = Simulation()
-    simulation.set_seed()
+    def fill(self, mouse_click):
+        ## bound to <Mouse Button 2>
+        self.pause()
+        self.engine.fill(*self.get_mouse_cell(mouse_click), self.paint_force, self.brush_radius, self.brush_shape)
+        self.draw()
+
+    def set_brush_radius(self, sign):
+        ## bound to <[> and <]>
+        self.brush_radius = max(0, self.brush_radius + sign)
+        print(f'brush radius = {self.brush_radius}')
+
+    def toggle_brush_shape(self):
+        ## bound to <o>
+        self.brush_shape = 'circle' if self.brush_shape == 'square' else 'square'
+        print(f'brush shape = {self.brush_shape.upper()}')
+
+    def toggle_paint_force(self):
+        ## bound to <s>
+        self.paint_force = self.paint_force % 3 + 1
+        print(f"paint species = {('GREEN', 'RED', 'YELLOW')[self.paint_force - 1]}")
+
+    def set_seeding(self, seeding):
+        self.pause()
+        self.engine.seeding, self.engine.seed_options = seeding, {}
+        print(f'seeding = {seeding.upper()}')
+        self.new_simulation()
+
+    def draw_population_bar(self, population):
+        max_population = self.engine.array.shape[0] * self.engine.array.shape[1]
+        green_width  = population[1] / max_population * self.width
+        red_width    = population[2] / max_population * self.width
+        yellow_width = population[3] / max_population * self.width
+        if self.population_rectangles is None:
+            self.population_rectangles = [self.population_bar.create_rectangle(0, 0, 0, 20, fill=color)
+                                          for color in ('#007f15', 'red', '#ffdd32')]
+        green, red, yellow = self.population_rectangles
+        self.population_bar.coords(green, 0, 0, green_width, 20)
+        self.population_bar.coords(red, green_width, 0, green_width+red_width, 20)
+        self.population_bar.coords(yellow, green_width+red_width, 0, green_width+red_width+yellow_width, 20)
+
+## smallest value each numeric option takes
+MINIMUMS = {'generations': 0, 'size': 1, 'seed_density': 0, 'spread_factor': 1, 'recursion_factor': 0, 'workers': 1,
+            'history_size': 0, 'block_size': 1, 'frame_every': 1, 'frame_processes': 1}
+## (lowest, highest) value of each seed option, None where it is unbounded
+SEED_OPTION_RANGES = {'count': (1, None), 'radius': (1, None), 'width': (1, None), 'axis': (0, 1), 'fraction': (0, 1)}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Run the simulation in a window, or headless with --headless')
+    parser.add_argument('--headless', action='store_true', help='run without a window and exit')
+    parser.add_argument('--generations', type=int, default=1000, help='generations to run headless')
+    parser.add_argument('--size', nargs=2, type=int, default=[100, 100], metavar=('ROWS', 'COLUMNS'))
+    parser.add_argument('--load', help='start from a saved .npz or .npy instead of a new seed')
+    parser.add_argument('--rng-seed', type=int, default=None)
+    parser.add_argument('--seed-density', type=int, default=100)
+    parser.add_argument('--seeding', default='scatter', choices=list(SEEDINGS))
+    parser.add_argument('--seed-options', nargs='+', default=[], metavar='NAME=VALUE', help='e.g. fraction=0.3 count=20 radius=8')
+    ## settings left out keep the engine defaults, or the values saved in --load
+    parser.add_argument('--spread-factor', type=int)
+    parser.add_argument('--recursion-factor', type=int)
+    parser.add_argument('--spin', type=int, help='direction index used when random spread is off')
+    parser.add_argument('--diagonal', action=argparse.BooleanOptionalAction, help='spread to the 4 diagonal neighbours only')
+    parser.add_argument('--faster-eating', action=argparse.BooleanOptionalAction)
+    parser.add_argument('--random-spread', action=argparse.BooleanOptionalAction)
+    parser.add_argument('--random-iter-order', action=argparse.BooleanOptionalAction)
+    parser.add_argument('--single-change', action=argparse.BooleanOptionalAction)
+    parser.add_argument('--kernel', choices=KERNELS)
+    parser.add_argument('--edges', choices=EDGES)
+    parser.add_argument('--workers', type=int, default=None, help='processes for the tiled kernel')
+    parser.add_argument('--packed', action='store_true', help='keep the copy of the last generation bit-packed, for very large grids')
+    parser.add_argument('--history-size', type=int, default=50)
+    parser.add_argument('--block-size', type=int, default=5, help='pixels per cell in the window and in frames')
+    parser.add_argument('--stop-when-decided', action='store_true', help='stop at extinction, a fixed point or a cycle')
+    parser.add_argument('--state', help='write the final state to this .npz')
+    parser.add_argument('--population', help='write the population of every generation to this .csv')
+    parser.add_argument('--frames', help='write PNG frames to this directory')
+    parser.add_argument('--frame-every', type=int, default=1)
+    parser.add_argument('--frame-processes', type=int, default=None)
+    args = parser.parse_args(argv)
+    for name, minimum in MINIMUMS.items():
+        values = getattr(args, name)
+        if values is not None and min(values if isinstance(values, list) else [values]) < minimum:
+            parser.error(f"--{name.replace('_', '-')} must be at least {minimum}, got {values}")
+    args.seed_options = get_seed_options(parser, args.seeding, args.seed_options)
+    return args
+
+def parse_option(option):
+    name, value = option.split('=', 1)
+    try: return name.replace('-', '_'), json.loads(value)
+    except ValueError: return name.replace('-', '_'), value
+
+def get_seed_options(parser, seeding, options):
+    ## every NAME=VALUE has to be a keyword of the strategy, with a value of its default's type
+    parameters = dict(list(inspect.signature(SEEDINGS[seeding]).parameters.items())[2:])
+    seed_options = {}
+    for option in options:
+        if '=' not in option: parser.error(f'--seed-options: expected NAME=VALUE, got {option!r}')
+        name, value = parse_option(option)
+        if name not in parameters:
+            parser.error(f"--seed-options: {seeding} has no option {name!r}, expected one of {', '.join(parameters)}")
+        default = parameters[name].default
+        expected = (int, float) if isinstance(default, float) else type(default)
+        if isinstance(value, bool) != isinstance(default, bool) or not isinstance(value, expected):
+            parser.error(f'--seed-options: {name} must be {type(default).__name__}, got {value!r}')
+        lowest, highest = SEED_OPTION_RANGES.get(name, (None, None))
+        if lowest is not None and value < lowest: parser.error(f'--seed-options: {name} must be at least {lowest}, got {value!r}')
+        if highest is not None and value > highest: parser.error(f'--seed-options: {name} must be at most {highest}, got {value!r}')
+        seed_options[name] = value
+    return seed_options
+
+def create_engine(args):
+    engine = Engine(rows=args.size[0], columns=args.size[1], seed_density=args.seed_density, history_size=args.history_size,
+                    rng_seed=args.rng_seed, workers=args.workers, packed=args.packed)
+    if args.load: engine.load_file(args.load)
+    for name in ('kernel', 'edges', 'faster_eating', 'random_spread', 'random_iter_order', 'single_change', 'spread_factor', 'recursion_factor'):
+        if getattr(args, name) is not None: setattr(engine, name, getattr(args, name))
+    if args.diagonal is not None: engine.set_direction_choices(DIRECTIONS['diagonal' if args.diagonal else 'all'])
+    if args.spin is not None: engine.spin = args.spin % len(engine.direction_options)
+    engine.detector = Detector(stop=args.stop_when_decided)
+    if not args.load: engine.set_seed(seeding=args.seeding, **args.seed_options)
+    return engine
+
+def run_headless(engine, args):
+    frames = FrameWriter(args.frames, engine.array.shape, args.block_size, args.frame_every, processes=args.frame_processes) if args.frames else None
+    if frames: frames.record(engine)
+    start, since = engine.generation, perf_counter()
+    while engine.generation - start < args.generations:
+        engine.step()
+        if frames: frames.record(engine)
+        if args.stop_when_decided and engine.detector.decided_at == engine.generation: break
+    elapsed = perf_counter() - since
+    if frames: frames.close()
+    if args.state: engine.save(args.state)
+    if args.population:
+        with open(args.population, 'w', newline='') as output:
+            writer = csv.writer(output)
+            writer.writerow(('generation', 'empty', 'green', 'red', 'yellow'))
+            writer.writerows(engine.get_population_series().tolist())
+    steps = engine.generation - start
+    print(f'{steps} generations in {elapsed:.2f}s ({steps / max(elapsed, 1e-9):.1f} steps/s), population {engine.get_population()}, {engine.detector.describe()}')
+
+def main(argv=None):
+    args = parse_args(argv)
+    engine = create_engine(args)
+    if args.headless: return run_headless(engine, args)
+    simulation = Simulation(engine, args.block_size)
     simulation.draw()
     simulation.mainloop()
 
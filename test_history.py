@@ -0,0 +1,34 @@
+import numpy
+import pytest
+from engine import Engine
+from history import History
+
+
+def test_rewinds_to_the_oldest_generation_when_it_is_a_keyframe():
+    ## with 50 diffs kept, the diff of keyframe 64 is trimmed away by generation 114
+    engine = Engine(rng_seed=1)
+    engine.set_seed()
+    engine.step(114)
+    while engine.back(): pass
+    assert engine.generation == 64
+
+@pytest.mark.parametrize('kernel', ['sequential', 'vectorized', 'tiled'])
+@pytest.mark.parametrize('keyframe_interval, memory_budget', [(4, None), (8, 4000)])
+def test_random_steps_edits_and_rewinds_restore_the_grids_seen(kernel, keyframe_interval, memory_budget):
+    engine = Engine(rows=40, columns=40, seed_density=150, kernel=kernel, history_size=30, rng_seed=2, workers=1)
+    engine.history = History(30, keyframe_interval, memory_budget)
+    engine.set_seed()
+    grids = {0: engine.array.copy()}
+    rng = numpy.random.default_rng(0)
+    for operation in range(300):
+        choice = rng.integers(3)
+        if choice == 0:
+            for step in range(int(rng.integers(1, 5))):
+                engine.step()
+                grids[engine.generation] = engine.array.copy()
+        elif choice == 1:
+            engine.paint(int(rng.integers(40)), int(rng.integers(40)), int(rng.integers(4)), radius=3)
+        elif engine.back(int(rng.integers(1, 8))):
+            assert numpy.array_equal(engine.array, grids[engine.generation])
+        grids[engine.generation] = engine.array.copy()
+        assert engine.population == numpy.bincount(engine.array.ravel(), minlength=4).tolist()
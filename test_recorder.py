@@ -0,0 +1,32 @@
+import numpy
+import pytest
+from engine import Engine
+from recorder import Recorder, Trajectory
+
+
+@pytest.mark.parametrize('every', [1, 3])
+def test_rewinds_and_edits_replace_recorded_frames(tmp_path, every):
+    engine = Engine(rows=40, columns=40, seed_density=200, history_size=100, rng_seed=1)
+    engine.set_seed()
+    engine.step(2)
+    engine.recorder = Recorder(tmp_path / 'run.traj', engine, every=every)
+    grids = {engine.generation: engine.array.copy()}
+    def run(steps):
+        for step in range(steps):
+            engine.step()
+            grids[engine.generation] = engine.array.copy()
+    run(5)
+    engine.back(2)
+    run(4)
+    engine.paint(10, 10, 2, radius=4)
+    grids[engine.generation] = engine.array.copy()
+    engine.back(7)
+    run(3)
+    engine.nuke(5, 5, 3)
+    grids[engine.generation] = engine.array.copy()
+    run(2)
+    engine.recorder.close()
+    trajectory = Trajectory(tmp_path / 'run.traj')
+    assert trajectory.get_generations().tolist() == list(range(2, engine.generation + 1, every))
+    for generation in trajectory.get_generations().tolist():
+        assert numpy.array_equal(trajectory.seek(generation), grids[generation])
@@ -0,0 +1,30 @@
+import itertools
+import numpy
+import pytest
+from engine import Engine
+from tiles import Tiles
+
+LAYOUTS    = ((1, 1), (1, 7), (1, 61), (2, 5), (3, 16))
+
+
+@pytest.fixture(scope='module')
+def tiles():
+    ## one pool per layout, shared by all settings
+    layouts = {layout: Tiles((61, 47), *layout) for layout in LAYOUTS}
+    yield layouts
+    for layout in layouts.values(): layout.close()
+
+@pytest.mark.parametrize('faster_eating, recursion_factor, spread_factor, edges',
+                         list(itertools.product([False, True], [0, 4], [1, 3], ['clip', 'wrap'])))
+def test_result_does_not_depend_on_workers_or_bands(tiles, faster_eating, recursion_factor, spread_factor, edges):
+    results = []
+    for layout in LAYOUTS:
+        engine = Engine(rows=61, columns=47, seed_density=400, kernel='tiled', edges=edges, history_size=0, rng_seed=5)
+        engine.set_seed()
+        engine.faster_eating, engine.recursion_factor, engine.spread_factor = faster_eating, recursion_factor, spread_factor
+        engine.tiles = tiles[layout]
+        engine.step(15)
+        assert engine.population == numpy.bincount(engine.array.ravel(), minlength=4).tolist()
+        results.append((engine.array.copy(), engine.changed_index.copy()))
+    for array, changed_index in results[1:]:
+        assert numpy.array_equal(array, results[0][0]) and numpy.array_equal(changed_index, results[0][1])
@@ -0,0 +1,167 @@
+import os
+import weakref
+import numpy
+from multiprocessing import Pool, shared_memory
+from engine import find_writes
+
+## random streams, every draw is a hash of (generation key, round, stream, cell)
+DIRECTION  = 1
+PRIORITY   = 2
+ROLL       = 3
+GOLDEN     = 0x9E3779B97F4A7C15
+
+## set in every worker by attach_memory(), views onto the grids and chain budgets in shared memory
+grids   = None
+budgets = None
+memory  = None
+
+
+def mix(values):
+    ## the splitmix64 finalizer, uint64 array arithmetic wraps modulo 2**64
+    values = (values ^ (values >> numpy.uint64(30))) * numpy.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> numpy.uint64(27))) * numpy.uint64(0x94D049BB133111EB)
+    return values ^ (values >> numpy.uint64(31))
+
+def get_key(key, round, stream):
+    return mix(numpy.array([(key + round * 4 + stream) * GOLDEN % 2**64], dtype=numpy.uint64))[0]
+
+def uniform(key, cells):
+    ## one float in [0, 1) per cell, the same in whichever tile asks for it
+    hashed = mix(cells.astype(numpy.uint64) * numpy.uint64(GOLDEN) + key)
+    return (hashed >> numpy.uint64(11)) * 2.0**-53
+
+def get_band(start, stop, rows, wrap):
+    ## rows start to stop plus two halo rows on each side, as runs of consecutive rows
+    if wrap: band = sorted(set(row % rows for row in range(start - 2, stop + 2)))
+    else: band = list(range(max(start - 2, 0), min(stop + 2, rows)))
+    runs = [[band[0], band[0] + 1]]
+    for row in band[1:]:
+        if row == runs[-1][1]: runs[-1][1] += 1
+        else: runs.append([row, row + 1])
+    return runs
+
+def step_tile(task, grids, budgets):
+    ## One round for the rows task['rows'] owns: every attacker in those rows and the halo
+    ## rows around them spreads against the source grid, and the winning writes that land
+    ## on owned cells go to the target grid. Halo attackers are needed because their
+    ## spreads can land on owned cells, and the second halo row because an owned eater
+    ## only vacates when its move into the first one wins. Writes outside the band are
+    ## left to the tile that owns them, which reaches the same verdict.
+    source, target = grids[task['parity']], grids[1 - task['parity']]
+    rows, columns = source.shape
+    start, stop = task['rows']
+    key, round = task['key'], task['round']
+    runs = get_band(start, stop, rows, task['edges'] == 'wrap')
+    if round == 0:
+        attackers = numpy.concatenate([numpy.flatnonzero(source[low:high]) + low * columns for low, high in runs])
+        budget = numpy.full(len(attackers), task['recursion_factor'])
+    else:
+        current = budgets[round % 2]
+        attackers = numpy.concatenate([numpy.flatnonzero(current[low:high] >= 0) + low * columns for low, high in runs])
+        budget = current.flat[attackers].astype(int)
+        rolls = (uniform(get_key(key, round, ROLL), attackers) * (budget + 1)).astype(int) > 0
+        attackers, budget = attackers[rolls], budget[rolls] - 1
+    options = numpy.array(task['direction_options'])
+    if task['random_spread']: index = (uniform(get_key(key, round, DIRECTION), attackers) * len(options)).astype(int)
+    else: index = numpy.full(len(attackers), task['spin'])
+    priority = uniform(get_key(key, round, PRIORITY), attackers)
+    cells, values, kinds, sources, attempts = find_writes(source, attackers, index, priority, options,
+                                                          task['spread_factor'], task['edges'], task['faster_eating'])
+    owned = (cells >= start * columns) & (cells < stop * columns)
+    cells, values, kinds, sources = cells[owned], values[owned], kinds[owned], sources[owned]
+    old_values = source.flat[cells]
+    target[start:stop] = source[start:stop]
+    target.flat[cells] = values
+    chain = kinds == 0
+    if task['recursion_factor']:
+        following = budgets[(round + 1) % 2]
+        following[start:stop] = -1
+        following.flat[cells[chain]] = budget[sources[chain]]
+    delta = numpy.bincount(values, minlength=4) - numpy.bincount(old_values, minlength=4)
+    counts = (attempts, int((kinds >= 0).sum()), int(((kinds < 0) & (values != 0)).sum()))
+    return cells, delta, int(chain.sum()), counts
+
+def attach_memory(names, grid_shape):
+    global grids, budgets, memory
+    memory = [shared_memory.SharedMemory(name=name) for name in names]
+    grids = [numpy.ndarray(grid_shape, dtype=numpy.uint8, buffer=block.buf) for block in memory[:2]]
+    budgets = [numpy.ndarray(grid_shape, dtype=numpy.int16, buffer=block.buf) for block in memory[2:]]
+
+def run_tile(task):
+    return step_tile(task, grids, budgets)
+
+def release(pool, memory):
+    if pool: pool.terminate()
+    for block in memory: block.unlink()
+
+
+class Tiles():
+
+    ## Runs the vectorized rules on bands of rows in a process pool. The grid and the
+    ## chain budgets live in shared memory, twice over: every round reads one copy and
+    ## writes the other, and the pool finishing the round is the barrier before the next.
+    ## A tile reads two halo rows on each side straight from the shared grid.
+    ##
+    ## Cross-tile conflicts are settled by the same rule as the vectorized kernel: of all
+    ## writes to a cell, the one whose attacker has the highest priority wins. Directions,
+    ## priorities and chain rolls are hashes of the cell and a per-generation key drawn
+    ## from the engine's generator, so every tile that sees an attacker gives it the same
+    ## numbers. The result does not depend on the number of tiles or workers.
+
+    def __init__(self, shape, workers=None, tile_count=None):
+        self.shape            = tuple(shape)
+        self.workers          = workers or os.cpu_count() or 1
+        self.tile_count       = min(self.shape[0], tile_count or 4 * self.workers)
+        bounds = numpy.linspace(0, self.shape[0], self.tile_count + 1).astype(int).tolist()
+        self.bounds           = list(zip(bounds[:-1], bounds[1:]))
+        size = self.shape[0] * self.shape[1]
+        if self.workers > 1:
+            self.memory       = [shared_memory.SharedMemory(create=True, size=size * itemsize) for itemsize in (1, 1, 2, 2)]
+            self.grids        = [numpy.ndarray(self.shape, dtype=numpy.uint8, buffer=block.buf) for block in self.memory[:2]]
+            self.budgets      = [numpy.ndarray(self.shape, dtype=numpy.int16, buffer=block.buf) for block in self.memory[2:]]
+            self.pool         = Pool(self.workers, initializer=attach_memory, initargs=([block.name for block in self.memory], self.shape))
+        else:
+            self.memory       = []
+            self.grids        = [numpy.zeros(self.shape, dtype=numpy.uint8) for parity in range(2)]
+            self.budgets      = [numpy.zeros(self.shape, dtype=numpy.int16) for parity in range(2)]
+            self.pool         = None
+        self.finalizer        = weakref.finalize(self, release, self.pool, self.memory)
+
+    def close(self):
+        self.finalizer()
+
+    def take_grid(self, engine):
+        ## the engine's grid is kept in one of the two buffers, so steps hand it over without copying
+        for parity, grid in enumerate(self.grids):
+            if engine.array is grid: return parity
+        numpy.copyto(self.grids[0], engine.array)
+        engine.array = self.grids[0]
+        return 0
+
+    def iterate(self, engine):
+        if engine.recursion_factor >= 2**15: raise ValueError(f'the tiled kernel supports a recursion_factor below {2**15}')
+        parity = self.take_grid(engine)
+        settings = dict(key=int(engine.rng.integers(2**62)), direction_options=engine.direction_options, spin=engine.spin,
+                        random_spread=engine.random_spread, spread_factor=engine.spread_factor, edges=engine.edges,
+                        faster_eating=engine.faster_eating, recursion_factor=engine.recursion_factor)
+        changed, round = [], 0
+        while True:
+            tasks = [dict(settings, rows=rows, parity=parity, round=round) for rows in self.bounds]
+            if self.pool: results = self.pool.map(run_tile, tasks)
+            else: results = [step_tile(task, self.grids, self.budgets) for task in tasks]
+            parity, chained = 1 - parity, 0
+            for cells, delta, chain, counts in results:
+                changed.append(cells)
+                chained += chain
+                for force, change in enumerate(delta.tolist()): engine.population[force] += change
+                if engine.profiler: engine.profiler.count(*counts, depth=round)
+            if not engine.recursion_factor or not chained: break
+            round += 1
+        engine.array = self.grids[parity]
+        ## each band's cells come sorted and inside its own rows, so one round is already in
+        ## order; only chained rounds can write a cell twice
+        changed = numpy.concatenate(changed)
+        if round:
+            changed.sort()
+            changed = changed[numpy.concatenate(([True], changed[1:] != changed[:-1]))]
+        engine.changed_index = changed